@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import random
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.renderer import add_utm_params
+from src.marketing import TrackingGenerator, ImageResizer
+from src.urls import clear_url_caches, url_cache_stats
+
+
+# Previous per-call implementations (parse and rebuild every time), kept as reference
+
+def legacy_set_params(url, params):
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    for k, v in params.items():
+        query[k] = [v]
+    return urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params,
+                       urlencode(query, doseq=True), parsed.fragment))
+
+
+def legacy_utm(url, campaign, content):
+    return legacy_set_params(url, {"utm_source": "atrapalo", "utm_medium": "newsletter",
+                                   "utm_campaign": campaign, "utm_content": content})
+
+
+def legacy_resize(url, width, quality):
+    params = {"auto": "avif", "quality": str(quality)}
+    if width:
+        params["width"] = str(width)
+    return legacy_set_params(url, params)
+
+
+def legacy_tracking(url, campaign):
+    return legacy_set_params(url.split("?")[0], {"atr_trk": "A2-3589-Instagram", "utm_source": "meta",
+                                                 "utm_medium": "social_cpc", "utm_campaign": campaign})
+
+
+def build_urls(total, distinct):
+    """'total' URLs drawn from 'distinct' product URLs, as in newsletters and drafts."""
+    rnd = random.Random(7)
+    products = [
+        f"https://www.atrapalo.com/entradas/oferta-{i}_e{4800000 + i}/?atr_trk=N1-{i}-BCN&ref=nl"
+        for i in range(distinct)
+    ]
+    return [rnd.choice(products) for _ in range(total)]
+
+
+def timed(label, func, urls):
+    start = time.perf_counter()
+    result = [func(u) for u in urls]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms")
+    return result, elapsed
+
+
+def bench(total, distinct):
+    print(f"\n--- {total} URLs ({distinct} distintas) ---")
+    urls = build_urls(total, distinct)
+    image_urls = [u.replace("www.atrapalo.com", "cdn.atrapalo.com") for u in urls]
+    cases = [
+        ("UTM newsletter", lambda u: legacy_utm(u, "black-friday", "card"),
+         lambda u: add_utm_params(u, "black-friday", "card"), urls),
+        ("Tracking A2", lambda u: legacy_tracking(u, "BlackFriday"),
+         lambda u: TrackingGenerator.generate_tracking(u, "social_a2", "BlackFriday"), urls),
+        ("Resize CDN", lambda u: legacy_resize(u, 600, 75),
+         lambda u: ImageResizer.resize_atrapalo_url(u, width=600, quality=75), image_urls),
+    ]
+
+    clear_url_caches()
+    for label, legacy, shared, data in cases:
+        old, old_time = timed(f"{label} (actual)", legacy, data)
+        new, new_time = timed(f"{label} (urls.py)", shared, data)
+        print(f"{'':<28} x{old_time / new_time:.1f}")
+        if old == new:
+            print("✅ Resultados idénticos")
+        else:
+            print("❌ Resultados distintos")
+
+    # Bulk tracking (API/CLI batches) bypasses the caches
+    old, old_time = timed("Tracking A2 lote (actual)", lambda u: legacy_tracking(u, "BlackFriday"), urls)
+    start = time.perf_counter()
+    new = [final for _, final in TrackingGenerator.generate_tracking_batch(urls, "social_a2", "BlackFriday")]
+    new_time = time.perf_counter() - start
+    print(f"{'Tracking A2 lote (urls.py)':<28} {new_time * 1000:9.1f} ms")
+    print(f"{'':<28} x{old_time / new_time:.1f}")
+    print("✅ Resultados idénticos" if old == new else "❌ Resultados distintos")
+
+    print(f"Caché: {url_cache_stats()}")
+
+
+if __name__ == "__main__":
+    bench(50_000, 200)
+    bench(50_000, 50_000)
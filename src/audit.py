@@ -0,0 +1,362 @@
+"""
+Audit Module
+Pre-send checks of a rendered (or archived) newsletter against the live network.
+
+Image audit: every <img src> is fetched concurrently through a pooled HTTP session;
+only the first bytes of each body are read to detect format and dimensions, the
+size comes from Content-Length (or from reading the body when it is missing).
+Results are cached by URL for a few minutes, so re-auditing after an edit only
+fetches the new images.
+
+Link check: every href of the final HTML (after apply_utm_tracking) is deduplicated
+and checked concurrently with HEAD, falling back to GET for servers that reject or
+mishandle HEAD. Broken links are reported with the block they appear in.
+
+The URLs come from user-supplied HTML, so by default only http(s) URLs whose host
+resolves to public addresses are fetched, redirects included: loopback, private,
+link-local and reserved addresses are refused (allow_private=True lifts this for
+local tests and the CLI --allow-private flag).
+"""
+
+import re
+import time
+import socket
+import struct
+import ipaddress
+import threading
+from functools import partial
+from html import unescape
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import LRUCache
+from .urls import parse_url
+from .renderer import iter_links
+
+# Concurrency / network
+MAX_WORKERS = 16
+REQUEST_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (compatible; AtrapaloNewsletterAudit/1.0)"
+
+# Images
+IMAGE_BUDGET_BYTES = 300 * 1024   # per-image weight flagged as too heavy
+SNIFF_BYTES = 64 * 1024           # enough for PNG/GIF/WebP/AVIF headers and most JPEG SOF markers
+MAX_BODY_BYTES = 20 * 1024 * 1024 # cap when the size has to be measured by reading the body
+CACHE_TTL = 600
+
+_image_cache = LRUCache(maxsize=2048, ttl=CACHE_TTL)
+_link_cache = LRUCache(maxsize=4096, ttl=CACHE_TTL)
+
+# HEAD answers that do not prove the page is gone: retried with GET
+HEAD_RETRY_STATUSES = {403, 404, 405, 429, 500, 501, 502, 503}
+
+_IMG_SRC_RE = re.compile(r"<img\b[^>]*?\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+
+_host_cache = LRUCache(maxsize=1024, ttl=CACHE_TTL)
+
+_sessions = {}
+_session_lock = threading.Lock()
+
+
+class BlockedURLError(requests.RequestException):
+    """The URL is not http(s) or its host resolves to a non-public address."""
+
+
+def _is_public_host(host: str) -> bool:
+    """True if every address the host resolves to is public (global unicast)."""
+    cached = _host_cache.get(host)
+    if cached is not None:
+        return cached
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        addresses = {ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos}
+        public = bool(addresses) and all(a.is_global and not a.is_multicast for a in addresses)
+    except (socket.gaierror, UnicodeError, ValueError):
+        public = False
+    _host_cache.set(host, public)
+    return public
+
+
+def is_public_url(url: str) -> bool:
+    """True for http(s) URLs whose host resolves only to public addresses."""
+    scheme, netloc = parse_url(url)[:2]
+    if scheme not in ("http", "https"):
+        return False
+    host = netloc.rsplit("@", 1)[-1]
+    host = host[1:].split("]")[0] if host.startswith("[") else host.split(":")[0]
+    return bool(host) and _is_public_host(host.lower())
+
+
+class _PublicOnlyAdapter(HTTPAdapter):
+    """Refuses every request (redirects included) to a non-public URL."""
+
+    def send(self, request, **kwargs):
+        if not is_public_url(request.url):
+            raise BlockedURLError(f"URL no permitida (host no público): {request.url}", request=request)
+        return super().send(request, **kwargs)
+
+
+def get_session(allow_private: bool = False) -> requests.Session:
+    """
+    Shared HTTP session with a connection pool sized for the audit workers.
+    Unless allow_private, it only connects to public hosts.
+    """
+    with _session_lock:
+        session = _sessions.get(allow_private)
+        if session is None:
+            session = requests.Session()
+            adapter_class = HTTPAdapter if allow_private else _PublicOnlyAdapter
+            adapter = adapter_class(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _sessions[allow_private] = session
+        return session
+
+
+def extract_image_urls(html: str) -> list:
+    """Returns the distinct http(s) image URLs of the HTML, in document order."""
+    urls = []
+    seen = set()
+    for match in _IMG_SRC_RE.finditer(html):
+        url = unescape(match.group(1)).strip()
+        if url.startswith(("http://", "https://")) and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+# Image format sniffing
+
+def _jpeg_size(data: bytes):
+    """Walks the JPEG markers up to the first SOFn frame header."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None, None
+
+
+def sniff_image(data: bytes) -> dict:
+    """
+    Detects format and pixel dimensions from the first bytes of an image.
+    Supports PNG, GIF, JPEG, WebP and AVIF. Unknown data gives format None.
+    """
+    fmt, width, height = None, None, None
+
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24:
+        fmt = "png"
+        width, height = struct.unpack(">II", data[16:24])
+    elif data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        fmt = "gif"
+        width, height = struct.unpack("<HH", data[6:10])
+    elif data.startswith(b"\xff\xd8"):
+        fmt = "jpeg"
+        width, height = _jpeg_size(data)
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        fmt = "webp"
+        chunk = data[12:16]
+        if chunk == b"VP8X" and len(data) >= 30:
+            width = 1 + int.from_bytes(data[24:27], "little")
+            height = 1 + int.from_bytes(data[27:30], "little")
+        elif chunk == b"VP8 " and len(data) >= 30:
+            width, height = (v & 0x3FFF for v in struct.unpack("<HH", data[26:30]))
+        elif chunk == b"VP8L" and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], "little")
+            width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    elif data[4:8] == b"ftyp" and data[8:12] in (b"avif", b"avis", b"mif1"):
+        fmt = "avif"
+        pos = data.find(b"ispe")
+        if pos != -1 and len(data) >= pos + 16:
+            width, height = struct.unpack(">II", data[pos + 8:pos + 16])
+
+    return {"format": fmt, "width": width, "height": height}
+
+
+# Image audit
+
+def fetch_image_info(url: str, allow_private: bool = False) -> dict:
+    """
+    Fetches one image (streamed) and returns its status, byte size, format and dimensions.
+    Network errors and refused (non-public) URLs are reported in the 'error' field
+    instead of raised. Results are cached by URL (see CACHE_TTL).
+    """
+    cached = _image_cache.get((url, allow_private))
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    info = {
+        "url": url, "status": None, "ok": False, "bytes": None, "content_type": None,
+        "format": None, "width": None, "height": None, "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        with get_session(allow_private).get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            info["status"] = response.status_code
+            info["ok"] = response.ok
+            info["content_type"] = response.headers.get("Content-Type")
+            if response.ok:
+                head = b""
+                for chunk in response.iter_content(chunk_size=16 * 1024):
+                    head += chunk
+                    if len(head) >= SNIFF_BYTES:
+                        break
+                info.update(sniff_image(head))
+
+                length = response.headers.get("Content-Length")
+                if length and length.isdigit() and not response.headers.get("Content-Encoding"):
+                    info["bytes"] = int(length)
+                else:
+                    # No usable length: count the rest of the body
+                    size = len(head)
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        size += len(chunk)
+                        if size > MAX_BODY_BYTES:
+                            break
+                    info["bytes"] = size
+    except requests.RequestException as e:
+        info["error"] = str(e)
+
+    info["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    # Network errors are not cached so a retry hits the server again
+    if info["error"] is None:
+        _image_cache.set((url, allow_private), info)
+    return dict(info, cached=False)
+
+
+def audit_images(html: str, budget_bytes: int = IMAGE_BUDGET_BYTES, max_workers: int = MAX_WORKERS,
+                 allow_private: bool = False) -> dict:
+    """
+    Audits every image of a newsletter concurrently.
+    Returns per-image bytes, format and dimensions, the total payload, and the
+    images that are broken or heavier than budget_bytes.
+    """
+    start = time.perf_counter()
+    urls = extract_image_urls(html)
+
+    if urls:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+            images = list(pool.map(partial(fetch_image_info, allow_private=allow_private), urls))
+    else:
+        images = []
+
+    for image in images:
+        image["over_budget"] = bool(image["bytes"] and image["bytes"] > budget_bytes)
+
+    return {
+        "images": images,
+        "count": len(images),
+        "total_bytes": sum(image["bytes"] or 0 for image in images),
+        "budget_bytes": budget_bytes,
+        "over_budget": [image["url"] for image in images if image["over_budget"]],
+        "broken": [image["url"] for image in images if not image["ok"]],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+# Link check
+
+def _link_block(url: str, context: str) -> str:
+    """Block of a link: its utm_content when already tracked, else the HTML context."""
+    for key, values in parse_url(url)[4]:
+        if key == "utm_content":
+            return values[0]
+    return context
+
+
+def collect_links(html: str) -> dict:
+    """Maps every distinct http(s) href of the HTML to the blocks it appears in (document order)."""
+    links = {}
+    for raw_url, context in iter_links(html):
+        url = unescape(raw_url).strip()
+        if not url.startswith(("http://", "https://")):
+            continue
+        blocks = links.setdefault(url, [])
+        block = _link_block(url, context)
+        if block not in blocks:
+            blocks.append(block)
+    return links
+
+
+def check_link(url: str, allow_private: bool = False) -> dict:
+    """
+    Checks one link with HEAD (following redirects), retrying with a streamed GET when
+    HEAD fails, and returns its status. Results are cached by URL (see CACHE_TTL).
+    """
+    cached = _link_cache.get((url, allow_private))
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    result = {"url": url, "status": None, "ok": False, "final_url": None, "method": "HEAD", "error": None}
+    start = time.perf_counter()
+    session = get_session(allow_private)
+    try:
+        response = session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+        if response.status_code in HEAD_RETRY_STATUSES:
+            result["method"] = "GET"
+            response.close()
+            response = session.get(url, allow_redirects=True, stream=True, timeout=REQUEST_TIMEOUT)
+        with response:
+            result["status"] = response.status_code
+            result["ok"] = response.ok
+            result["final_url"] = response.url
+    except requests.RequestException as e:
+        result["error"] = str(e)
+
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    if result["error"] is None:
+        _link_cache.set((url, allow_private), result)
+    return dict(result, cached=False)
+
+
+def check_links(html: str, max_workers: int = MAX_WORKERS, allow_private: bool = False) -> dict:
+    """
+    Checks every distinct link of a newsletter concurrently.
+    Returns one entry per link (status, final URL, blocks where it appears)
+    and the broken ones with their block context.
+    """
+    start = time.perf_counter()
+    links = collect_links(html)
+
+    if links:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(links))) as pool:
+            results = list(pool.map(partial(check_link, allow_private=allow_private), links))
+    else:
+        results = []
+
+    for result in results:
+        result["blocks"] = links[result["url"]]
+
+    return {
+        "links": results,
+        "count": len(results),
+        "broken": [
+            {"url": r["url"], "status": r["status"], "error": r["error"], "blocks": r["blocks"]}
+            for r in results if not r["ok"]
+        ],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def get_audit_cache_stats() -> dict:
+    """Hit/miss counters of the audit caches."""
+    return {"images": _image_cache.stats(), "links": _link_cache.stats()}
+
+
+def clear_audit_cache():
+    """Forgets every cached audit result."""
+    _image_cache.clear()
+    _link_cache.clear()
+    _host_cache.clear()
@@ -0,0 +1,76 @@
+"""
+Config Module
+Web app settings. Every value can be overridden with an NWS_* environment variable
+(e.g. NWS_DATA_DIR, NWS_PORT, NWS_WORKERS) or passed to webapp.create_app().
+"""
+
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(f"NWS_{name}")
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+def load_config(overrides: dict | None = None) -> dict:
+    """
+    Builds the app configuration: environment variables over defaults, then overrides.
+    Data directories are derived from DATA_DIR unless set individually.
+    """
+    data_dir = (overrides or {}).get("DATA_DIR") or _env("DATA_DIR", BASE_DIR)
+    upload_folder = _env("UPLOAD_FOLDER", os.path.join(data_dir, "uploads"))
+    drafts_folder = _env("DRAFTS_FOLDER", os.path.join(data_dir, "drafts"))
+    config = {
+        "DATA_DIR": data_dir,
+        "UPLOAD_FOLDER": upload_folder,
+        "DRAFTS_FOLDER": drafts_folder,
+        "PREVIEWS_FOLDER": _env("PREVIEWS_FOLDER", os.path.join(data_dir, "previews")),
+        "VISUAL_ARCHIVES_FOLDER": _env("VISUAL_ARCHIVES_FOLDER", os.path.join(data_dir, "visual_archives")),
+        # Precompressed (gzip/brotli) variants of served files, see http_cache.py
+        "HTTP_CACHE_FOLDER": _env("HTTP_CACHE_FOLDER", os.path.join(upload_folder, "http_cache")),
+        # Product URL -> drafts reverse index, see draft_index.py (rebuilt from drafts/ if missing)
+        "DRAFT_INDEX_FILE": _env("DRAFT_INDEX_FILE", os.path.join(upload_folder, "draft_index.json")),
+        # Cache of scraped products reused by new drafts, see product_catalog.py (drafts do not depend on it)
+        "PRODUCT_CATALOG_FILE": _env("PRODUCT_CATALOG_FILE", os.path.join(drafts_folder, "catalog.sqlite3")),
+        "CATALOG_MAX_AGE": _env("CATALOG_MAX_AGE", 24 * 3600, int),
+
+        # Editor previews (see preview_store.PreviewStore)
+        "PREVIEW_MEMORY_BYTES": _env("PREVIEW_MEMORY_BYTES", 64 * 1024 * 1024, int),
+        "PREVIEW_MAX_SESSIONS": _env("PREVIEW_MAX_SESSIONS", 500, int),
+        "PREVIEW_TTL": _env("PREVIEW_TTL", 12 * 3600, int),
+
+        # Share links (see share_store.ShareStore)
+        "SHARE_TTL": _env("SHARE_TTL", 30 * 24 * 3600, int),
+        "SHARE_MAX_BYTES": _env("SHARE_MAX_BYTES", 200 * 1024 * 1024, int),
+
+        # Server (see server.py)
+        "HOST": _env("HOST", "127.0.0.1"),
+        "PORT": _env("PORT", 5000, int),
+        "WORKERS": _env("WORKERS", 1, int),
+        "THREADS": _env("THREADS", 8, int),
+        "DEBUG": _env("DEBUG", False, bool),
+    }
+    config.update(overrides or {})
+    # The preview store is shared through disk by default: the number of processes is not
+    # known when gunicorn is started directly ('gunicorn -w 4 ...' leaves WORKERS at 1).
+    # NWS_PREVIEW_SHARED=0 keeps previews in process memory (single-process servers only).
+    if "PREVIEW_SHARED" not in config:
+        config["PREVIEW_SHARED"] = _env("PREVIEW_SHARED", True, bool)
+    return config
+
+
+def data_folders(config: dict) -> list:
+    """Directories the app writes to (created by create_app)."""
+    return [
+        config["UPLOAD_FOLDER"],
+        config["DRAFTS_FOLDER"],
+        config["PREVIEWS_FOLDER"],
+        config["VISUAL_ARCHIVES_FOLDER"],
+        config["HTTP_CACHE_FOLDER"],
+    ]
@@ -4,7 +4,13 @@ Handles reading and formatting data from Atrápalo's newsletter CSV files.
 Includes logic for price formatting, description shortening, and card parsing.
 """
 
+import io
 import csv
+import os
+import hashlib
+
+from .cache import LRUCache
+from .instrumentation import instrumented, span
 
 # Color mapping for card badges based on tags
 BADGE_COLORS = {
@@ -78,6 +84,187 @@ def shorten(text: str, max_chars: int = MAX_DESCRIPTION_CHARS) -> str:
     return truncated + "…"
 
 
+class Card:
+    """
+    Compact representation of a newsletter product card.
+    Only the CSV-derived values are stored (in __slots__); the display fields
+    (metadata, description_short, rating_value_formatted...) are derived on access.
+    Supports both attribute access (templates) and the read-only dict interface
+    (card["price"], card.get("conditions")) used by the rest of the code.
+    """
+
+    __slots__ = (
+        "order", "title", "metadata_1", "metadata_2", "description", "image", "url",
+        "cta_label", "discount_percentage", "price_old", "price", "badge_text", "badge_color",
+        "rating_value", "rating_text", "separator", "separator_image", "conditions",
+        "_description_short",
+    )
+
+    # Keys exposed through the dict interface, in the historical order
+    FIELDS = (
+        "order", "title", "metadata_1", "metadata_2", "metadata",
+        "description_raw", "description_short", "description",
+        "image", "url", "cta_url", "cta_label", "cta_type",
+        "discount_percentage", "price_old", "price", "badge_text", "badge_color",
+        "rating_value", "rating_value_formatted", "rating_text",
+        "separator", "separator_image", "conditions",
+    )
+
+    cta_type = "ver_plan"
+
+    def __init__(self, order, title="", metadata_1="", metadata_2="", description="", image="", url="",
+                 cta_label="Ver plan", discount_percentage=None, price_old=None, price=None,
+                 badge_text=None, badge_color=None, rating_value=None, rating_text=None,
+                 separator=None, separator_image=None, conditions=""):
+        self.order = order
+        self.title = title
+        self.metadata_1 = metadata_1
+        self.metadata_2 = metadata_2
+        self.description = description
+        self.image = image
+        self.url = url
+        self.cta_label = cta_label
+        self.discount_percentage = discount_percentage
+        self.price_old = price_old
+        self.price = price
+        self.badge_text = badge_text
+        self.badge_color = badge_color
+        self.rating_value = rating_value
+        self.rating_text = rating_text
+        self.separator = separator
+        self.separator_image = separator_image
+        self.conditions = conditions
+        self._description_short = None
+
+    # Derived fields
+
+    @property
+    def metadata(self):
+        return f"{self.metadata_1.strip()} · {self.metadata_2.strip()}".strip(" ·")
+
+    @property
+    def description_raw(self):
+        return self.description
+
+    @property
+    def description_short(self):
+        if self._description_short is None:
+            self._description_short = shorten(self.description)
+        return self._description_short
+
+    @property
+    def cta_url(self):
+        return self.url
+
+    @property
+    def rating_value_formatted(self):
+        return format_rating(self.rating_value) if self.rating_value is not None else None
+
+    # Dict compatibility
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def to_dict(self) -> dict:
+        """Returns the full card as a plain dictionary (e.g. for JSON)."""
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __eq__(self, other):
+        if isinstance(other, Card):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Card(order={self.order!r}, title={self.title!r})"
+
+
+def json_default(obj):
+    """
+    'default' hook for json.dump(s): serializes Card objects as plain dicts.
+    e.g. json.dumps(newsletter_data, default=json_default)
+    """
+    if isinstance(obj, Card):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _cell(row, i):
+    """Returns the stripped value of column i, or '' if the row is too short."""
+    if i is None or i >= len(row):
+        return ""
+    return row[i].strip()
+
+
+def _to_float(val):
+    """Parses a Spanish-formatted number ('1.234,50') into a float, or None."""
+    if not val:
+        return None
+    val = val.replace(".", "").replace(",", ".")
+    try:
+        return float(val)
+    except ValueError:
+        return None
+
+
+# CSV header keys -> (section, field) of the newsletter dictionary
+HEADER_KEY_MAP = {
+    "HEADER:": ("header", "image_url"),
+    "LINK HEADER:": ("header", "link_url"),
+    "PREHEADER:": ("header", "preheader"),
+    "\ufeffPREHEADER:": ("header", "preheader"),
+
+    "TXT_BOTON_FOOTER:": ("footer", "button_text"),
+    "LINK_FOOTER:": ("footer", "button_url"),
+    "BANNER_FOOTER:": ("footer", "banner_image_url"),
+    "LINK_BANNER_FOOTER:": ("footer", "banner_link_url"),
+
+    "CONDICIONES_FOOTER:": ("footer", "conditions"),
+    "\ufeffCONDICIONES_FOOTER:": ("footer", "conditions"),
+}
+
+
+def parse_header_row(row, header, footer):
+    """
+    Applies a single CSV header row (e.g. 'PREHEADER:,...') to the header/footer dicts.
+    Unknown keys and empty rows are ignored.
+    """
+    if not row or not row[0]:
+        return
+
+    key = row[0].strip()
+    target_field = HEADER_KEY_MAP.get(key)
+    if not target_field:
+        return
+
+    value = (row[1] or "").strip() if len(row) > 1 else ""
+
+    target, field = target_field
+    if target == "header":
+        header[field] = value
+    elif target == "footer":
+        footer[field] = value
+
+
 def parse_header_block(rows):
     """
     Extracts global newsletter configuration (Header, Preheader, Footer) from raw CSV rows.
@@ -85,208 +272,311 @@ def parse_header_block(rows):
     header = {}
     footer = {}
 
-    key_map = {
-        "HEADER:": ("header", "image_url"),
-        "LINK HEADER:": ("header", "link_url"),
-        "PREHEADER:": ("header", "preheader"),
-        "\ufeffPREHEADER:": ("header", "preheader"),
-
-        "TXT_BOTON_FOOTER:": ("footer", "button_text"),
-        "LINK_FOOTER:": ("footer", "button_url"),
-        "BANNER_FOOTER:": ("footer", "banner_image_url"),
-        "LINK_BANNER_FOOTER:": ("footer", "banner_link_url"),
-
-        "CONDICIONES_FOOTER:": ("footer", "conditions"),
-        "\ufeffCONDICIONES_FOOTER:": ("footer", "conditions"),
-    }
-
     for row in rows:
-        if not row or not row[0]:
-            continue
+        parse_header_row(row, header, footer)
 
-        key = row[0].strip()
-        value = (row[1] or "").strip() if len(row) > 1 else ""
+    return header, footer
 
-        target_field = key_map.get(key)
-        if not target_field:
-            continue
 
-        target, field = target_field
-        if target == "header":
-            header[field] = value
-        elif target == "footer":
-            footer[field] = value
+def parse_rating(rating_raw: str):
+    """
+    Splits a rating cell ('9,2 - Excelente' or '9.2') into (value, text).
+    Value is a float (None if not numeric); text is None without a ' - ' part.
+    """
+    if not rating_raw:
+        return None, None
 
-    return header, footer
+    if "-" in rating_raw:
+        parts = rating_raw.split("-", 1)
+        rating_value_str = parts[0].strip().replace(",", ".")
+        try:
+            rating_value = float(rating_value_str)
+        except Exception:
+            rating_value = None
+        return rating_value, parts[1].strip()
 
+    rating_value_str = rating_raw.replace(",", ".")
+    try:
+        rating_value = float(rating_value_str)
+    except Exception:
+        rating_value = None
+    return rating_value, None
 
-def parse_cards(header_row, data_rows):
+
+def build_card(order, title="", metadata_1="", metadata_2="", description="", image="", url="",
+               cta="", discount="", price_old=None, price=None, tags="", rating="",
+               separator="", separator_image="", conditions="") -> Card:
     """
-    Parses individual product cards from CSV data.
+    Builds a Card from stripped field values, applying the newsletter rules:
+    default CTA, integer discount, price formatting, badge from tags and rating split.
+    price_old / price are numbers (or None); the other fields are strings.
+    """
+    rating_value, rating_text = parse_rating(rating)
+    has_badge = tags and tags.lower() != "sin tag"
+
+    return Card(
+        order,
+        title=title,
+        metadata_1=metadata_1,
+        metadata_2=metadata_2,
+        description=description,
+        image=image,
+        url=url,
+        cta_label=cta if cta else "Ver plan",
+        discount_percentage=int(discount) if discount else None,
+        price_old=format_price(price_old) if price_old else None,
+        price=format_price(price),
+        badge_text=tags if has_badge else None,
+        badge_color=BADGE_COLORS.get(tags) if has_badge else None,
+        rating_value=rating_value,
+        rating_text=rating_text,
+        separator=separator or None,
+        separator_image=separator_image or None,
+        conditions=conditions or "",
+    )
+
+
+def iter_cards(header_row, data_rows):
+    """
+    Lazily parses product cards from CSV data, yielding Card objects in file order.
+    data_rows can be any iterable (e.g. a live csv.reader), so rows are
+    processed as they are read.
     Handles field mapping, price conversion, rating extraction, and badge assignment.
     """
     idx = {name: i for i, name in enumerate(header_row)}
 
-    def get(row, name):
-        i = idx.get(name)
-        if i is None or i >= len(row):
-            return ""
-        return row[i].strip()
-
-    def to_float(val):
-        if not val:
-            return None
-        val = val.replace(".", "").replace(",", ".")
-        try:
-            return float(val)
-        except ValueError:
-            return None
-
-    cards = []
+    i_order = idx.get("Orden")
+    i_title = idx.get("Nombre Oferta")
+    i_meta1 = idx.get("Metadato 1")
+    i_meta2 = idx.get("Metadato 2")
+    i_description = idx.get("Descripción")
+    i_image = idx.get("URL foto")
+    i_url = idx.get("URL oferta")
+    i_discount = idx.get("Descuento")
+    i_price_old = idx.get("Precio")
+    i_price = idx.get("Precio ATR")
+    i_tags = idx.get("TAGS")
+    i_separator = idx.get("SEPARADOR")
+    i_separator_img = idx.get("SEPARADOR IMG")
+    i_ctas = [idx.get("CTA"), idx.get("\ufeffCTA"), idx.get(" CTA")]
+    i_conditions = idx.get("CONDICIONES")
+    i_rating = idx.get("RATING")
 
     for row in data_rows:
         if not row or not row[0].strip():
             continue
 
         try:
-            order = int(get(row, "Orden"))
+            order = int(_cell(row, i_order))
         except ValueError:
             continue
 
-        title = get(row, "Nombre Oferta")
-        meta1 = get(row, "Metadato 1")
-        meta2 = get(row, "Metadato 2")
+        cta_from_csv = ""
+        for i in i_ctas:
+            cta_from_csv = _cell(row, i)
+            if cta_from_csv:
+                break
+
+        yield build_card(
+            order,
+            title=_cell(row, i_title),
+            metadata_1=_cell(row, i_meta1),
+            metadata_2=_cell(row, i_meta2),
+            description=_cell(row, i_description),
+            image=_cell(row, i_image),
+            url=_cell(row, i_url),
+            cta=cta_from_csv,
+            discount=_cell(row, i_discount),
+            price_old=_to_float(_cell(row, i_price_old)),
+            price=_to_float(_cell(row, i_price)),
+            tags=_cell(row, i_tags),
+            rating=_cell(row, i_rating),
+            separator=_cell(row, i_separator),
+            separator_image=_cell(row, i_separator_img),
+            conditions=_cell(row, i_conditions),
+        )
 
-        description_raw = get(row, "Descripción")
-        description_short = shorten(description_raw)
 
-        image = get(row, "URL foto")
-        url = get(row, "URL oferta")
+def parse_cards(header_row, data_rows):
+    """
+    Parses individual product cards from CSV data.
+    Returns the list of cards sorted by their 'Orden' value.
+    """
+    cards = list(iter_cards(header_row, data_rows))
+    cards.sort(key=lambda c: c.order)
+    return cards
 
-        discount = get(row, "Descuento")
-        price_old_raw = get(row, "Precio")
-        price_raw = get(row, "Precio ATR")
 
-        tags = get(row, "TAGS")
-        separator = get(row, "SEPARADOR")
-        separator_img = get(row, "SEPARADOR IMG")
+def stream_newsletter_csv(csv_path) -> dict:
+    """
+    Streaming entry point for CSV parsing.
+    Reads header rows until the 'Orden' row and returns
+    {"header": ..., "footer": ..., "cards": <iterator>} where cards are parsed
+    one at a time, in file order, while the rest of the file is read.
+    csv_path may also be an open text file (opened with newline="").
+    The file is closed once the card iterator is exhausted or closed.
+    """
+    f = open(csv_path, newline="", encoding="utf-8") if isinstance(csv_path, (str, os.PathLike)) else csv_path
+    reader = csv.reader(f)
 
-        cta_from_csv = (
-            get(row, "CTA")
-            or get(row, "\ufeffCTA")
-            or get(row, " CTA")
-        )
+    header = {}
+    footer = {}
+    table_header = None
 
-        conditions_raw = get(row, "CONDICIONES")
+    for row in reader:
+        if row and row[0].strip() == "Orden":
+            table_header = row
+            break
+        parse_header_row(row, header, footer)
 
-        # RATING
-        rating_raw = get(row, "RATING")
-        rating_value = None
-        rating_text = None
-
-        if rating_raw:
-            if "-" in rating_raw:
-                parts = rating_raw.split("-", 1)
-                rating_value_str = parts[0].strip().replace(",", ".")
-                try:
-                    rating_value = float(rating_value_str)
-                except Exception:
-                    rating_value = None
-                rating_text = parts[1].strip()
-            else:
-                rating_value_str = rating_raw.replace(",", ".")
-                try:
-                    rating_value = float(rating_value_str)
-                except Exception:
-                    rating_value = None
-                rating_text = None
+    if table_header is None:
+        f.close()
 
-        price_old_float = to_float(price_old_raw)
-        price_float = to_float(price_raw)
+    def cards():
+        if table_header is None:
+            return
+        with f:
+            yield from iter_cards(table_header, reader)
 
-        card = {
-            "order": order,
-            "title": title,
-            "metadata_1": meta1,
-            "metadata_2": meta2,
-            "metadata": f"{meta1.strip()} · {meta2.strip()}".strip(" ·"),
+    return {
+        "header": header,
+        "footer": footer,
+        "cards": cards(),
+    }
 
-            "description_raw": description_raw,
-            "description_short": description_short,
-            "description": description_raw,
 
-            "image": image,
-            "url": url,
+@instrumented("csv_parse", input_size=lambda csv_path: os.path.getsize(csv_path), output_size=lambda data: None)
+def csv_to_newsletter_dict(csv_path: str) -> dict:
+    """
+    Main entry point for CSV parsing.
+    Splits the CSV into Header and Card blocks and returns a structured dictionary.
+    Rows are streamed from disk; only the resulting cards are kept in memory.
+    """
+    return _collect_stream(stream_newsletter_csv(csv_path))
 
-            "cta_url": url,
-            "cta_label": cta_from_csv if cta_from_csv else "Ver plan",
-            "cta_type": "ver_plan",
 
-            "discount_percentage": int(discount) if discount else None,
+def _collect_stream(stream: dict) -> dict:
+    """Materializes a streamed CSV into the newsletter dict (cards sorted by order)."""
+    cards = list(stream["cards"])
+    cards.sort(key=lambda c: c.order)
 
-            "price_old": format_price(price_old_float) if price_old_float else None,
-            "price": format_price(price_float),
+    return {
+        "header": stream["header"],
+        "footer": stream["footer"],
+        "cards": cards,
+    }
 
-            "badge_text": None,
-            "badge_color": None,
 
-            # RATING
-            "rating_value": rating_value,
-            "rating_value_formatted": format_rating(rating_value) if rating_value is not None else None,
-            "rating_text": rating_text,
+# Multi-campaign files
 
-            "separator": separator or None,
-            "separator_image": separator_img or None,
+# Planning rows used to name each campaign of a multi-campaign file
+SECTION_NAME_KEYS = ("FENVIO:", "PRODUCTO:", "LOCALIZACIÓN:")
 
-            "conditions": conditions_raw or "",
-        }
 
-        if tags and tags.lower() != "sin tag":
-            card["badge_text"] = tags
-            card["badge_color"] = BADGE_COLORS.get(tags)
+def _is_key_row(row) -> bool:
+    """True for 'KEY:,value' rows (header block rows, known or not)."""
+    return bool(row) and row[0].strip().lstrip("\ufeff").endswith(":")
 
-        cards.append(card)
 
-    cards.sort(key=lambda c: c["order"])
-    return cards
+def _section_name(labels: dict, number: int) -> str:
+    """Campaign name from its planning rows, e.g. '2025-08-29 MIXOU BARCELONA'."""
+    parts = [labels[key] for key in SECTION_NAME_KEYS if labels.get(key)]
+    return " ".join(parts) if parts else f"campaign-{number}"
 
 
-def csv_to_newsletter_dict(csv_path: str) -> dict:
+def _build_section(header_rows, table_header, table_rows) -> tuple:
+    """Parses one header block plus its 'Orden' table into (labels, newsletter dict)."""
+    header = {}
+    footer = {}
+    labels = {}
+    for row in header_rows:
+        parse_header_row(row, header, footer)
+        if _is_key_row(row) and len(row) > 1:
+            labels[row[0].strip().lstrip("\ufeff")] = (row[1] or "").strip()
+
+    cards = list(iter_cards(table_header, table_rows)) if table_header else []
+    cards.sort(key=lambda c: c.order)
+
+    return labels, {"header": header, "footer": footer, "cards": cards}
+
+
+def iter_newsletter_sections(csv_path):
     """
-    Main entry point for CSV parsing.
-    Splits the CSV into Header and Card blocks and returns a structured dictionary.
+    Splits a file holding several campaigns (header block + 'Orden' table, repeated)
+    into newsletter dicts, in one streaming pass. Yields (name, newsletter_dict) pairs
+    as soon as each section is complete; only one section is kept in memory.
+
+    A section ends when key rows ('PREHEADER:,...') are followed by a new 'Orden' row.
+    Key rows after the last table with no table of their own are applied to the last
+    section (trailing footer rows). Otherwise a single-section file yields exactly what
+    csv_to_newsletter_dict returns. Names come from the FENVIO/PRODUCTO/LOCALIZACIÓN rows.
     """
-    rows = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
+    f = open(csv_path, newline="", encoding="utf-8") if isinstance(csv_path, (str, os.PathLike)) else csv_path
+
+    with f:
         reader = csv.reader(f)
+        header_rows = []
+        table_header = None
+        table_rows = []
+        pending = []  # key rows seen after a table: next section's header or trailing footer
+        number = 0
+
         for row in reader:
-            rows.append(row)
+            first = row[0].strip() if row else ""
+
+            if first == "Orden":
+                if table_header is not None:
+                    number += 1
+                    labels, data = _build_section(header_rows, table_header, table_rows)
+                    yield _section_name(labels, number), data
+                    header_rows, table_rows = pending, []
+                    pending = []
+                table_header = row
+            elif table_header is None:
+                header_rows.append(row)
+            elif pending or _is_key_row(row):
+                pending.append(row)
+            else:
+                table_rows.append(row)
 
-    header_block = []
-    table_header = None
-    table_rows = []
-    in_table = False
+        number += 1
+        labels, data = _build_section(header_rows + pending, table_header, table_rows)
+        yield _section_name(labels, number), data
 
-    for row in rows:
-        if not in_table and row and row[0].strip() == "Orden":
-            in_table = True
-            table_header = row
-            continue
 
-        if not in_table:
-            header_block.append(row)
-        else:
-            table_rows.append(row)
+# Parsed CSVs keyed by the SHA-256 of their bytes
+PARSE_CACHE_SIZE = 32
+_parse_cache = LRUCache(maxsize=PARSE_CACHE_SIZE)
 
-    header, footer = parse_header_block(header_block)
 
-    if table_header is None:
-        cards = []
-    else:
-        cards = parse_cards(table_header, table_rows)
+def csv_bytes_to_newsletter_dict(data: bytes) -> dict:
+    """
+    Same as csv_to_newsletter_dict, for CSV content already in memory (e.g. an upload).
+    Results are cached by content hash: uploading identical bytes again skips parsing.
+    The returned dict and card list are fresh copies, so callers may add keys
+    (card_mode, title...) without touching the cached entry.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+
+    with span("csv_parse", input_size=len(data)) as record:
+        cached = _parse_cache.get(digest)
+        record["cache_hit"] = cached is not None
+        if cached is None:
+            cached = _collect_stream(stream_newsletter_csv(io.StringIO(data.decode("utf-8"), newline="")))
+            _parse_cache.set(digest, cached)
 
     return {
-        "header": header,
-        "footer": footer,
-        "cards": cards,
+        "header": dict(cached["header"]),
+        "footer": dict(cached["footer"]),
+        "cards": list(cached["cards"]),
     }
+
+
+def get_parse_cache_stats() -> dict:
+    """Hit/miss counters of the CSV parse cache."""
+    return _parse_cache.stats()
+
+
+def clear_parse_cache():
+    """Drops every cached CSV parse."""
+    _parse_cache.clear()
@@ -0,0 +1,167 @@
+"""
+Draft Index Module
+Reverse index from product URL to the drafts (and item positions) that use it,
+so a price change can be applied to every draft with a single fetch per product.
+
+URLs are matched by urls.canonical_url (no tracking query, no trailing slash).
+The index is kept in a JSON file outside drafts/ and is updated by the routes that
+write or delete drafts. Each entry remembers the mtime of its draft: sync() re-reads
+only the drafts changed behind its back (other worker processes, manual edits) and
+drops the deleted ones, so a stale or missing index file is repaired on use.
+"""
+
+import os
+import json
+import threading
+
+from .urls import canonical_url
+
+INDEX_VERSION = 1
+
+
+def item_urls(items) -> dict:
+    """
+    Canonical URL -> positions (0-based) of the items of a draft that link to it.
+    Items are draft snapshots (see product_catalog.snapshot_items) or plain items.
+    """
+    urls = {}
+    for position, item in enumerate(items or []):
+        url = canonical_url(str(item.get("url") or item.get("ref") or "")) if isinstance(item, dict) else ""
+        if url:
+            urls.setdefault(url, []).append(position)
+    return urls
+
+
+class DraftIndex:
+    """
+    drafts_dir: folder with the drafts (*.json).
+    index_path: JSON file where the index is persisted.
+    """
+
+    def __init__(self, drafts_dir: str, index_path: str):
+        self.drafts_dir = drafts_dir
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._drafts = {}   # filename -> {"mtime_ns": int, "urls": {url: [positions]}}
+        self._reverse = {}  # url -> {filename: [positions]}
+        self._load()
+        self.sync()
+
+    # Persistence
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for filename, entry in data.get("drafts", {}).items():
+            self._set(filename, entry["mtime_ns"], entry["urls"])
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "drafts": self._drafts}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    # Entries
+
+    def _unset(self, filename):
+        entry = self._drafts.pop(filename, None)
+        if entry is None:
+            return
+        for url in entry["urls"]:
+            drafts = self._reverse.get(url)
+            if drafts is not None:
+                drafts.pop(filename, None)
+                if not drafts:
+                    del self._reverse[url]
+
+    def _set(self, filename, mtime_ns, urls):
+        self._unset(filename)
+        self._drafts[filename] = {"mtime_ns": mtime_ns, "urls": urls}
+        for url, positions in urls.items():
+            self._reverse.setdefault(url, {})[filename] = positions
+
+    def _mtime_ns(self, filename):
+        try:
+            return os.stat(os.path.join(self.drafts_dir, filename)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def update(self, filename: str, items):
+        """Indexes a draft that has just been written with these items."""
+        with self._lock:
+            mtime_ns = self._mtime_ns(filename)
+            if mtime_ns is None:
+                self._unset(filename)
+            else:
+                self._set(filename, mtime_ns, item_urls(items))
+            self._save()
+
+    def remove(self, filename: str):
+        """Drops a deleted draft from the index."""
+        with self._lock:
+            if filename in self._drafts:
+                self._unset(filename)
+                self._save()
+
+    def sync(self) -> dict:
+        """
+        Brings the index in line with drafts_dir: re-reads drafts whose mtime changed,
+        adds new ones and removes deleted ones. Unreadable drafts are indexed as empty.
+        """
+        changed = {"indexed": 0, "removed": 0}
+        with self._lock:
+            current = {}
+            if os.path.isdir(self.drafts_dir):
+                for entry in os.scandir(self.drafts_dir):
+                    if entry.is_file() and entry.name.endswith(".json"):
+                        current[entry.name] = entry.stat().st_mtime_ns
+
+            for filename in [name for name in self._drafts if name not in current]:
+                self._unset(filename)
+                changed["removed"] += 1
+
+            for filename, mtime_ns in current.items():
+                entry = self._drafts.get(filename)
+                if entry is not None and entry["mtime_ns"] == mtime_ns:
+                    continue
+                try:
+                    with open(os.path.join(self.drafts_dir, filename), "r", encoding="utf-8") as f:
+                        items = json.load(f).get("items", [])
+                except (OSError, ValueError, AttributeError):
+                    items = []
+                self._set(filename, mtime_ns, item_urls(items))
+                changed["indexed"] += 1
+
+            if changed["indexed"] or changed["removed"]:
+                self._save()
+        return changed
+
+    # Lookups
+
+    def lookup(self, url: str) -> dict:
+        """Drafts using a product URL: {filename: [positions]}."""
+        self.sync()
+        with self._lock:
+            return {filename: list(positions)
+                    for filename, positions in self._reverse.get(canonical_url(url), {}).items()}
+
+    def lookup_many(self, urls) -> dict:
+        """{canonical url: {filename: [positions]}} for the URLs used by at least one draft."""
+        self.sync()
+        found = {}
+        with self._lock:
+            for url in urls:
+                key = canonical_url(url)
+                if key in self._reverse:
+                    found[key] = {filename: list(positions) for filename, positions in self._reverse[key].items()}
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"drafts": len(self._drafts), "urls": len(self._reverse)}
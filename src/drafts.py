@@ -0,0 +1,265 @@
+"""
+Drafts Module
+Scraper drafts (drafts/*.json: 'config' with the csv_* header fields and 'items'
+with the products) exported to the legacy newsletter CSV.
+
+Rows are produced lazily by draft_csv_rows, shared by the single-draft CSV
+download and the multi-draft ZIP export, so exports are streamed to the client
+without building the whole file in memory.
+
+draft_to_newsletter_dict maps a draft straight to the dict used by
+render_newsletter, with the same result as parsing its exported CSV.
+"""
+
+import io
+import re
+import csv
+import time
+import zipfile
+
+from .urls import rewrite, raw_param
+from .csv_parser import build_card, _to_float
+
+# Header block of the legacy CSV: (label, config key, apply tracking to the value)
+CSV_HEADER_ROWS = (
+    ("LOCALIZACIÓN:", "csv_localizacion", False),
+    ("PRODUCTO:", "csv_producto", False),
+    ("TIPO DE ENVÍO:", "csv_tipo_envio", False),
+    ("FENVIO:", "csv_fenvio", False),
+    ("HEADER:", "csv_header", False),
+    ("LINK HEADER:", "csv_link_header", True),
+    ("ASUNTO:", "csv_asunto", False),
+    ("PREHEADER:", "csv_preheader", False),
+    ("TXT_BOTON_FOOTER:", "csv_txt_boton", False),
+    ("LINK_FOOTER:", "csv_link_footer", True),
+    ("BANNER_FOOTER:", "csv_banner", False),
+    ("LINK_BANNER_FOOTER:", "csv_link_banner", True),
+    ("CONDICIONES_FOOTER:", "csv_condiciones", False),
+)
+
+CSV_TABLE_HEADER = [
+    "Orden", "Nombre Oferta", "Metadato 1", "Metadato 2", "Descripción", "URL foto", "URL oferta",
+    "Descuento", "Precio", "Precio ATR", "TAGS", "RATING", "SEPARADOR", "SEPARADOR IMG", "CTA",
+]
+
+# Rows are flushed to the client in chunks of about this many characters
+CSV_CHUNK_CHARS = 16 * 1024
+
+
+def force_spanish_format(val):
+    """Utility: Formats numbers to use Spanish conventions (dot as thousand separator, comma as decimal)."""
+    if not val: return ""
+    val = str(val).replace("€", "").strip()
+    if "," in val and "." not in val: return val
+    try:
+        f = float(val)
+        usa = "{:,.2f}".format(f)
+        if usa.endswith(".00"): usa = "{:,.0f}".format(f)
+        return usa.replace(",", "X").replace(".", ",").replace("X", ".")
+    except:
+        return val
+
+
+def inject_tracking(url, campaign_name, date_str):
+    """
+    Utility: Injects Atrápalo-specific 'atr_trk' parameters into product URLs.
+    Uses IDs for activities and dates for hotels.
+    """
+    if not url: return ""
+    base_url = url.split("?")[0]
+
+    # LÓGICA HÍBRIDA:
+    # 1. Si es HOTEL -> Usar fecha (ignorar ID)
+    if "/hoteles/" in base_url or "/hotel/" in base_url:
+        if date_str: identifier = date_str.replace("-", "")
+        else: identifier = time.strftime("%Y%m%d")
+
+    # 2. Si es OCIO -> Usar ID si existe
+    else:
+        match = re.search(r"_(e|a)(\d+)", base_url)
+        if match:
+            identifier = match.group(2)
+        else:
+            if date_str: identifier = date_str.replace("-", "")
+            else: identifier = time.strftime("%Y%m%d")
+
+    camp = campaign_name.strip() if campaign_name else "CAMPAÑA"
+    return rewrite(base_url, raw_param("atr_trk", f"N1-{identifier}-{camp}"))
+
+
+def _value(mapping, key, default=""):
+    """Field of a draft config/item; missing or null fields take the default."""
+    value = mapping.get(key)
+    return default if value is None else value
+
+
+def draft_csv_rows(config: dict, items):
+    """
+    Yields the rows of the legacy CSV for a draft: header block, three blank rows,
+    then the 'Orden' table. Applies tracking to URLs and formats prices for
+    legacy CSV imports.
+    """
+    campaign_name = config.get("csv_localizacion", "CAMPAÑA")
+    date_str = _value(config, "csv_fenvio")
+    def trk(u): return inject_tracking(u, campaign_name, date_str)
+
+    e = [""] * 12
+    for label, key, tracked in CSV_HEADER_ROWS:
+        value = _value(config, key)
+        yield [label, trk(value) if tracked else value] + e
+    yield []
+    yield []
+    yield []
+
+    yield CSV_TABLE_HEADER
+
+    for item in items:
+        r_val = _value(item, "rating")
+        r_fin = f"{r_val} - Excelente" if r_val and "-" not in r_val else r_val
+
+        yield [
+            item.get("order"),
+            item.get("title"),
+            item.get("metadata_1"),
+            item.get("metadata_2"),
+            item.get("description"),
+            item.get("image"),
+            trk(item.get("url")),
+            item.get("discount"),
+            force_spanish_format(_value(item, "price_old")),
+            force_spanish_format(_value(item, "price")),
+            _value(item, "tag", "Sin tag"),
+            r_fin,
+            _value(item, "separator"),
+            "",
+            _value(item, "cta", "Ver plan"),
+        ]
+
+
+def _text(value) -> str:
+    """A draft value as the CSV parser reads it back: stripped text, '' for null."""
+    return "" if value is None else str(value).strip()
+
+
+def draft_number(value):
+    """
+    Price of a draft item as a float (None if empty), equal to formatting it with
+    force_spanish_format and parsing the CSV cell back.
+    """
+    if not value:
+        return None
+    value = str(value).replace("€", "").strip()
+    if "," in value and "." not in value:
+        return _to_float(value)
+    try:
+        return float(f"{float(value):.2f}")
+    except ValueError:
+        return _to_float(value)
+
+
+def draft_to_newsletter_dict(config: dict, items) -> dict:
+    """
+    Builds the newsletter dict ({"header", "footer", "cards"}) of a draft directly,
+    without the CSV round trip. Applies the same rules as the export (tracking,
+    price format, default tag/CTA, rating text) and as csv_parser (cards sorted
+    by 'order', items without a numeric order skipped).
+    """
+    campaign_name = config.get("csv_localizacion", "CAMPAÑA")
+    date_str = _value(config, "csv_fenvio")
+    def trk(u): return inject_tracking(u, campaign_name, date_str)
+    def field(key): return _text(config.get(key))
+
+    header = {
+        "image_url": field("csv_header"),
+        "link_url": trk(field("csv_link_header")),
+        "preheader": field("csv_preheader"),
+    }
+    footer = {
+        "button_text": field("csv_txt_boton"),
+        "button_url": trk(field("csv_link_footer")),
+        "banner_image_url": field("csv_banner"),
+        "banner_link_url": trk(field("csv_link_banner")),
+        "conditions": field("csv_condiciones"),
+    }
+
+    cards = []
+    for item in items:
+        try:
+            order = int(_text(item.get("order")))
+        except ValueError:
+            continue
+
+        rating = str(_value(item, "rating"))
+        if rating and "-" not in rating:
+            rating = f"{rating} - Excelente"
+
+        cards.append(build_card(
+            order,
+            title=_text(item.get("title")),
+            metadata_1=_text(item.get("metadata_1")),
+            metadata_2=_text(item.get("metadata_2")),
+            description=_text(item.get("description")),
+            image=_text(item.get("image")),
+            url=_text(trk(item.get("url"))),
+            cta=_text(_value(item, "cta", "Ver plan")),
+            discount=_text(item.get("discount")),
+            price_old=draft_number(_value(item, "price_old")),
+            price=draft_number(_value(item, "price")),
+            tags=_text(_value(item, "tag", "Sin tag")),
+            rating=rating.strip(),
+            separator=_text(item.get("separator")),
+        ))
+
+    cards.sort(key=lambda c: c.order)
+    return {"header": header, "footer": footer, "cards": cards}
+
+
+def iter_draft_csv(config: dict, items, chunk_chars: int = CSV_CHUNK_CHARS):
+    """Streams a draft's CSV as text chunks (UTF-8 BOM first, for Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+    buffer.write("\ufeff")
+    for row in draft_csv_rows(config, items):
+        writer.writerow(row)
+        if buffer.tell() >= chunk_chars:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only, non-seekable file that hands over what was written (ZipFile target)."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_drafts_zip(drafts):
+    """
+    Streams a ZIP archive with one CSV per draft.
+    drafts: iterable of (csv_name, config, items), consumed one draft at a time,
+    so only the draft being written is held in memory.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for csv_name, config, items in drafts:
+            with archive.open(csv_name, "w") as entry:
+                for chunk in iter_draft_csv(config, items):
+                    entry.write(chunk.encode("utf-8"))
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
@@ -0,0 +1,201 @@
+"""
+HTTP Cache Module
+Conditional GET and response compression for the HTML the web app serves
+(editor previews, archived newsletters, uploads).
+
+Responses carry a strong ETag (hash of the content) so a reload of an unchanged
+preview is answered with 304 and no body. Bodies are compressed with brotli when
+the client accepts it and the 'brotli' package is installed, otherwise gzip.
+Each encoding has its own ETag ('<hash>-gz', '<hash>-br'), so a cache never
+serves one body under the validator of another.
+Compressed variants are kept in memory for dynamic content and written once to
+disk next to the app data for files, so each version is compressed only once.
+Files are streamed from disk, never read whole into memory.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import mimetypes
+import threading
+
+from flask import request, make_response, send_file
+
+from .cache import LRUCache
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# Bodies smaller than this are sent as they are
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# Disk variants: total budget and minimum interval between prunes
+VARIANTS_MAX_BYTES = 100 * 1024 * 1024
+PRUNE_INTERVAL = 300
+
+_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+_ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+
+_memory_variants = LRUCache(maxsize=64)
+_file_etags = LRUCache(maxsize=1024)
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def content_etag(data: bytes) -> str:
+    """Strong ETag value for a body."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def variant_etag(etag: str, encoding: str | None) -> str:
+    """ETag of one encoding of a body (the plain hash for the identity body)."""
+    return etag + _ETAG_SUFFIXES[encoding] if encoding else etag
+
+
+def negotiate_encoding(content_type: str) -> str | None:
+    """Best encoding accepted by the current request for a content type (br, gzip or None)."""
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return None
+    accepted = request.accept_encodings
+    if HAS_BROTLI and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _finish(response, etag: str, cache_control: str):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def cached_response(body, content_type: str = "text/html; charset=utf-8",
+                    cache_control: str = "no-cache", etag: str | None = None):
+    """
+    Response for in-memory content (str or bytes): 304 if the client already has
+    this version, else the body compressed for the client. Compressed bodies are
+    memoized by ETag, so an unchanged preview is compressed once.
+    """
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    etag = etag or content_etag(data)
+
+    encoding = negotiate_encoding(content_type) if len(data) >= MIN_COMPRESS_BYTES else None
+    if variant_etag(etag, encoding) in request.if_none_match:
+        return _finish(make_response("", 304), variant_etag(etag, encoding), cache_control)
+
+    if encoding:
+        key = (etag, encoding)
+        compressed = _memory_variants.get(key)
+        if compressed is None:
+            compressed = compress(data, encoding)
+            _memory_variants.set(key, compressed)
+        response = make_response(compressed)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = make_response(data)
+
+    response.headers["Content-Type"] = content_type
+    return _finish(response, variant_etag(etag, encoding), cache_control)
+
+
+def file_etag(path: str, stat: os.stat_result) -> str:
+    """Content ETag of a file, hashed once per (path, mtime, size)."""
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    etag = _file_etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(256 * 1024), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+        _file_etags.set(key, etag)
+    return etag
+
+
+def _prune_variants(variants_dir: str, max_bytes: int):
+    """Removes the least recently written variants beyond the disk budget."""
+    global _last_prune
+    with _prune_lock:
+        if time.time() - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = time.time()
+        files = []
+        for entry in os.scandir(variants_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _disk_variant(path: str, etag: str, encoding: str, variants_dir: str) -> str:
+    """Path of the precompressed variant of a file version, created on first use."""
+    variant = os.path.join(variants_dir, f"{etag}{_EXTENSIONS[encoding]}")
+    if not os.path.exists(variant):
+        with open(path, "rb") as f:
+            data = compress(f.read(), encoding)
+        tmp_path = f"{variant}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, variant)
+        _prune_variants(variants_dir, VARIANTS_MAX_BYTES)
+    return variant
+
+
+def send_cached_file(path: str, variants_dir: str, content_type: str | None = None,
+                     cache_control: str = "no-cache"):
+    """
+    Serves a file with a strong ETag, 304 handling and a precompressed variant
+    stored in variants_dir. Returns 404 if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return make_response("Archivo no encontrado", 404)
+
+    if content_type is None:
+        guessed, _ = mimetypes.guess_type(path)
+        content_type = guessed or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+
+    etag = file_etag(path, stat)
+    encoding = negotiate_encoding(content_type) if stat.st_size >= MIN_COMPRESS_BYTES else None
+    if variant_etag(etag, encoding) in request.if_none_match:
+        return _finish(make_response("", 304), variant_etag(etag, encoding), cache_control)
+
+    if encoding:
+        os.makedirs(variants_dir, exist_ok=True)
+        body_path = _disk_variant(path, etag, encoding, variants_dir)
+    else:
+        body_path = path
+
+    # Streamed by the WSGI server (file wrapper); validators are handled above
+    response = send_file(body_path, mimetype=content_type, conditional=False, etag=False,
+                         last_modified=stat.st_mtime, max_age=None)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return _finish(response, variant_etag(etag, encoding), cache_control)
@@ -0,0 +1,164 @@
+"""
+Instrumentation Module
+Lightweight timing spans for the render pipeline (CSV parsing, Jinja rendering,
+UTM post-processing, preview writes).
+
+Each span records its duration, input size and output bytes. Spans opened inside
+a render_trace() are grouped and emitted as one structured (JSON) log line per
+render; all spans are kept in memory to serve aggregated stats over recent renders.
+Stage durations and render counts are also recorded in metrics (/metrics).
+"""
+
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from .metrics import inc, observe
+
+logger = logging.getLogger("nws.render")
+
+# Number of spans / renders kept for the in-process stats
+MAX_RECENT_SPANS = 1000
+MAX_RECENT_RENDERS = 100
+
+_recent_spans = deque(maxlen=MAX_RECENT_SPANS)
+_recent_renders = deque(maxlen=MAX_RECENT_RENDERS)
+_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("nws_render_trace", default=None)
+
+
+def byte_size(value):
+    """Returns the UTF-8 size of a str/bytes result, or None for other types."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return None
+
+
+def _log(payload):
+    """Emits one structured log line."""
+    logger.info(json.dumps(payload, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(stage: str, input_size=None):
+    """
+    Times a block of code as a pipeline stage.
+    Yields the span record so the caller can fill 'output_bytes' (or other fields).
+    """
+    record = {"stage": stage, "input_size": input_size, "output_bytes": None}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        record["duration_ms"] = round(elapsed * 1000, 3)
+        observe("nws_render_stage_duration_seconds", elapsed, stage=stage)
+        with _lock:
+            _recent_spans.append(record)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append(record)
+        else:
+            _log({"event": "render_span", **record})
+
+
+def instrumented(stage: str, input_size=None, output_size=byte_size):
+    """
+    Decorator version of span().
+    input_size: optional callable receiving the call arguments.
+    output_size: callable receiving the result (defaults to its byte size).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            size = None
+            if input_size is not None:
+                try:
+                    size = input_size(*args, **kwargs)
+                except Exception:
+                    size = None
+            with span(stage, size) as record:
+                result = func(*args, **kwargs)
+                record["output_bytes"] = output_size(result)
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def render_trace(name: str, **fields):
+    """
+    Groups the spans of one render (e.g. one /generate request).
+    On exit, logs a single structured line with every stage and stores it for the stats API.
+    """
+    trace = {"render": name, **fields, "spans": []}
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        trace["finished_at"] = time.time()
+        inc("nws_renders_total", render=name)
+        with _lock:
+            _recent_renders.append(trace)
+        _log({"event": "render", **trace})
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def get_render_stats() -> dict:
+    """
+    Aggregates the recent spans per stage (count, avg/p50/p95/max duration,
+    average input and output size) and returns the latest render traces.
+    """
+    with _lock:
+        spans = list(_recent_spans)
+        renders = list(_recent_renders)
+
+    by_stage = {}
+    for record in spans:
+        by_stage.setdefault(record["stage"], []).append(record)
+
+    stages = {}
+    for stage, records in by_stage.items():
+        durations = sorted(r["duration_ms"] for r in records)
+        inputs = [r["input_size"] for r in records if r["input_size"] is not None]
+        outputs = [r["output_bytes"] for r in records if r["output_bytes"] is not None]
+        stages[stage] = {
+            "count": len(records),
+            "avg_ms": round(sum(durations) / len(durations), 3),
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "max_ms": durations[-1],
+            "avg_input_size": round(sum(inputs) / len(inputs), 1) if inputs else None,
+            "avg_output_bytes": round(sum(outputs) / len(outputs), 1) if outputs else None,
+        }
+
+    return {
+        "stages": stages,
+        "renders": len(renders),
+        "recent_renders": renders[-10:],
+    }
+
+
+def reset_render_stats():
+    """Clears the in-memory spans and renders."""
+    with _lock:
+        _recent_spans.clear()
+        _recent_renders.clear()
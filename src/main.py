@@ -2,22 +2,244 @@
 CLI Entry Point
 Allows generating a newsletter directly from the command line using a local CSV file.
 Useful for testing the rendering engine without launching the web server.
+
+Usage:
+    python -m src.main                                  # Renders the default test CSV
+    python -m src.main render <csv> [-o output.html] [--responsive] [--optimize [--budget BYTES]]
+    python -m src.main variants <csv> <variants.json> [-o dir] [-j workers] [--optimize]
+    python -m src.main multi <csv> [-o dir] [-j workers] [--card-mode MODE] [--optimize]
+    python -m src.main tracking <urls.csv> --channel push_n27 --campaign NAME [-o tracked.csv]
+    python -m src.main audit <newsletter.html> [--budget BYTES] [-j workers] [--links] [--allow-private]
 """
 
+import argparse
+import csv
+import json
+import sys
+import time
 from pathlib import Path
-from .renderer import render_newsletter_from_csv
+from .csv_parser import csv_to_newsletter_dict, iter_newsletter_sections
+from .renderer import render_newsletter, render_many, render_campaigns, apply_responsive_images
+from .optimizer import optimize_email_html, GMAIL_CLIP_BYTES
+from .marketing import TrackingGenerator, iter_url_column, iter_tracking_csv
+from .audit import audit_images, check_links, IMAGE_BUDGET_BYTES, MAX_WORKERS
 
+BASE_DIR = Path(__file__).resolve().parent.parent
 
-def main():
-    """Main execution function for CLI-based rendering."""
-    base_dir = Path(__file__).resolve().parent.parent
-    csv_path = base_dir / "data" / "NL OU 2025 - TEST JSON2 (9).csv"
-    output_path = base_dir / "output" / "newsletter.html"
-    render_newsletter_from_csv(str(csv_path), str(output_path))
+
+def cmd_render(args):
+    """Renders a single newsletter from a CSV file."""
+    csv_path = args.csv or BASE_DIR / "data" / "NL OU 2025 - TEST JSON2 (9).csv"
+    output_path = args.output or BASE_DIR / "output" / "newsletter.html"
+
+    html = render_newsletter(csv_to_newsletter_dict(str(csv_path)))
+    if args.responsive:
+        html = apply_responsive_images(html)
+    if args.optimize:
+        html, report = optimize_email_html(html, budget_bytes=args.budget)
+        print_optimization(report)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(html, encoding="utf-8")
 
     print("Newsletter generada en:")
     print(output_path)
 
 
+def print_optimization(report):
+    """Prints the byte size of an optimized newsletter against its budget."""
+    status = "OK" if report["within_budget"] else "SUPERA EL LÍMITE"
+    print(
+        f"Peso: {report['original_bytes']} -> {report['final_bytes']} bytes "
+        f"(presupuesto {report['budget_bytes']}, margen {report['headroom_bytes']}) [{status}]"
+    )
+
+
+def cmd_variants(args):
+    """
+    Renders every variant described in a JSON file in parallel.
+    The JSON file holds a list of override dicts, e.g.:
+    [{"name": "bcn-urbano", "card_mode": "urbano"}, {"name": "bcn-vacacional", "card_mode": "vacacional"}]
+    """
+    base_data = csv_to_newsletter_dict(str(args.csv))
+    with open(args.variants, "r", encoding="utf-8") as f:
+        variants = json.load(f)
+
+    output_dir = args.output or BASE_DIR / "output" / "variants"
+    report = render_many(
+        base_data, variants, output_dir=str(output_dir), max_workers=args.workers,
+        optimize=args.optimize, budget_bytes=args.budget, responsive=args.responsive,
+    )
+
+    print_render_report(report, "variantes")
+
+
+def cmd_multi(args):
+    """
+    Renders every campaign of a multi-campaign CSV (several header blocks and
+    'Orden' tables in one file) in parallel, one HTML file per campaign.
+    """
+    def campaigns():
+        for name, data in iter_newsletter_sections(str(args.csv)):
+            data["card_mode"] = args.card_mode
+            yield name, data
+
+    output_dir = args.output or BASE_DIR / "output" / "campaigns"
+    report = render_campaigns(
+        campaigns(), output_dir=str(output_dir), max_workers=args.workers,
+        optimize=args.optimize, budget_bytes=args.budget, responsive=args.responsive,
+    )
+    print_render_report(report, "campañas")
+
+
+def cmd_tracking(args):
+    """
+    Adds channel tracking to every URL of a CSV/TXT file (one URL per row or a 'url'
+    column) and writes a CSV with the original and tracked URLs. Reports throughput.
+    """
+    options = {
+        "source": args.source,
+        "product": args.product,
+        "social_network": args.social_network,
+        "date_str": args.date,
+    }
+    start = time.perf_counter()
+    count = 0
+
+    with open(args.urls, newline="", encoding="utf-8-sig") as src:
+        urls = iter_url_column(csv.reader(src))
+        results = TrackingGenerator.generate_tracking_batch(urls, args.channel, args.campaign, **options)
+
+        def counted():
+            nonlocal count
+            for pair in results:
+                count += 1
+                yield pair
+
+        if args.output:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.output, "w", newline="", encoding="utf-8") as dst:
+                dst.writelines(iter_tracking_csv(counted()))
+        else:
+            sys.stdout.writelines(iter_tracking_csv(counted()))
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0
+    print(f"{count} URLs procesadas en {elapsed * 1000:.2f} ms ({rate:,.0f} URLs/s)", file=sys.stderr)
+    if args.output:
+        print(f"Resultado: {args.output}", file=sys.stderr)
+
+
+def cmd_audit(args):
+    """
+    Audits the images of a rendered or archived newsletter (weight, format, dimensions)
+    and, with --links, checks every link.
+    """
+    html = args.html.read_text(encoding="utf-8")
+    report = audit_images(html, budget_bytes=args.budget, max_workers=args.workers,
+                          allow_private=args.allow_private)
+
+    for image in report["images"]:
+        if image["error"] or not image["ok"]:
+            status = f"ROTA ({image['error'] or image['status']})"
+        elif image["over_budget"]:
+            status = "PESADA"
+        else:
+            status = "OK"
+        size = f"{image['width']}x{image['height']}" if image["width"] else "?"
+        weight = f"{image['bytes'] / 1024:.1f} KB" if image["bytes"] is not None else "?"
+        print(f"{status:<12} {weight:>10}  {image['format'] or '?':<5} {size:>10}  {image['url']}")
+
+    print(
+        f"{report['count']} imágenes, {report['total_bytes'] / 1024:.1f} KB en total "
+        f"({len(report['over_budget'])} sobre {report['budget_bytes'] // 1024} KB, "
+        f"{len(report['broken'])} rotas) en {report['elapsed_ms']:.0f} ms"
+    )
+
+    if args.links:
+        links = check_links(html, max_workers=args.workers, allow_private=args.allow_private)
+        for link in links["broken"]:
+            print(f"ENLACE ROTO ({link['error'] or link['status']}) [{', '.join(link['blocks'])}] {link['url']}")
+        print(f"{links['count']} enlaces comprobados, {len(links['broken'])} rotos en {links['elapsed_ms']:.0f} ms")
+
+
+def print_render_report(report, label):
+    """Prints one line per rendered file and the totals of a parallel render."""
+    for entry in report["variants"]:
+        print(f"{entry['name']:<30} {entry['render_ms']:>9.2f} ms  {entry['bytes']:>8} bytes  {entry['output']}")
+        if entry["optimization"]:
+            print_optimization(entry["optimization"])
+    print(f"{report['count']} {label} generadas en {report['total_ms']:.2f} ms")
+    print(f"Informe: {Path(report['output_dir']) / 'render_report.json'}")
+
+
+def add_postprocess_arguments(parser):
+    """Adds the optional post-processing flags (responsive images, email-weight optimization) to a sub-command."""
+    parser.add_argument("--responsive", action="store_true", help="Resize CDN images to the width of their slot")
+    parser.add_argument("--optimize", action="store_true", help="Minify the output for email delivery")
+    parser.add_argument("--budget", type=int, default=GMAIL_CLIP_BYTES, help="Byte budget (Gmail clipping)")
+
+
+def build_parser():
+    """Builds the argument parser with one sub-command per workflow."""
+    parser = argparse.ArgumentParser(prog="python -m src.main", description="Newsletter rendering CLI")
+    sub = parser.add_subparsers(dest="command")
+
+    p_render = sub.add_parser("render", help="Render a newsletter from a CSV file")
+    p_render.add_argument("csv", nargs="?", type=Path)
+    p_render.add_argument("-o", "--output", type=Path)
+    add_postprocess_arguments(p_render)
+    p_render.set_defaults(func=cmd_render)
+
+    p_variants = sub.add_parser("variants", help="Render several variants of a campaign in parallel")
+    p_variants.add_argument("csv", type=Path)
+    p_variants.add_argument("variants", type=Path, help="JSON file with the list of variant overrides")
+    p_variants.add_argument("-o", "--output", type=Path, help="Target directory")
+    p_variants.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    add_postprocess_arguments(p_variants)
+    p_variants.set_defaults(func=cmd_variants)
+
+    p_multi = sub.add_parser("multi", help="Render every campaign of a multi-campaign CSV in parallel")
+    p_multi.add_argument("csv", type=Path)
+    p_multi.add_argument("-o", "--output", type=Path, help="Target directory")
+    p_multi.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    p_multi.add_argument("--card-mode", default="urbano", choices=["urbano", "vacacional"], help="Card layout")
+    add_postprocess_arguments(p_multi)
+    p_multi.set_defaults(func=cmd_multi)
+
+    p_tracking = sub.add_parser("tracking", help="Add channel tracking to a list of URLs")
+    p_tracking.add_argument("urls", type=Path, help="CSV/TXT file with one URL per row or a 'url' column")
+    p_tracking.add_argument("-o", "--output", type=Path, help="Output CSV (stdout if omitted)")
+    p_tracking.add_argument("--channel", required=True, choices=["push_n27", "social_a2", "generic"])
+    p_tracking.add_argument("--campaign", required=True)
+    p_tracking.add_argument("--source", default="APP", help="N27 source (APP/WEB)")
+    p_tracking.add_argument("--product", default="Entradas", help="N27 product")
+    p_tracking.add_argument("--social-network", default="instagram", help="A2 network")
+    p_tracking.add_argument("--date", default=None, help="Send date (YYYY-MM-DD), defaults to today")
+    p_tracking.set_defaults(func=cmd_tracking)
+
+    p_audit = sub.add_parser("audit", help="Check images (weight, format, dimensions) and links of a newsletter")
+    p_audit.add_argument("html", type=Path, help="Rendered or archived newsletter HTML")
+    p_audit.add_argument("--budget", type=int, default=IMAGE_BUDGET_BYTES, help="Per-image byte budget")
+    p_audit.add_argument("-j", "--workers", type=int, default=MAX_WORKERS, help="Concurrent requests")
+    p_audit.add_argument("--links", action="store_true", help="Also check every link")
+    p_audit.add_argument("--allow-private", action="store_true",
+                         help="Also fetch loopback/private hosts (e.g. a local test server)")
+    p_audit.set_defaults(func=cmd_audit)
+
+    return parser
+
+
+def main(argv=None):
+    """Main execution function for CLI-based rendering."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        args = parser.parse_args(["render"])
+
+    args.func(args)
+
+
 if __name__ == "__main__":
     main()
@@ -3,8 +3,11 @@ Marketing Tools Module
 Provides logic for generating tracking URLs (N27, A2) and resizing images via Atrápalo's CDN.
 """
 
+import io
+import csv
 import time
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+from .urls import rewrite, set_params, resize_rule
 
 class TrackingGenerator:
     """Handles the creation of complex tracking strings for different marketing channels."""
@@ -28,9 +31,43 @@ class TrackingGenerator:
             return url
 
     @staticmethod
-    def _generate_n27(base_url, campaign, source="APP", product="Entradas", date_str=None, **kwargs):
+    def generate_tracking_batch(urls, channel, campaign, **kwargs):
+        """
+        Batch version of generate_tracking for large URL lists.
+        The campaign-level values (dates, atr_trk, UTM query) are computed once;
+        each URL then only gets its query rebuilt. Lazily yields (original, final) pairs,
+        so URLs can be streamed from and to files. Bulk lists are mostly distinct URLs,
+        so they bypass the URL caches (see urls.rewrite).
+        """
+        params = TrackingGenerator.campaign_params(channel, campaign, **kwargs)
+        rule = set_params(params) if params is not None else None
+
+        for url in urls:
+            if not url:
+                yield url, ""
+            elif rule is None:
+                yield url, url
+            else:
+                yield url, rewrite(url, rule, strip_query=True, cached=False)
+
+    @staticmethod
+    def campaign_params(channel, campaign, **kwargs):
+        """Returns the tracking parameters of a channel/campaign, or None for unknown channels."""
+        if channel == "push_n27":
+            return TrackingGenerator._n27_params(campaign, **kwargs)
+        elif channel == "social_a2":
+            return TrackingGenerator._a2_params(campaign, **kwargs)
+        return None
+
+    @staticmethod
+    def _generate_n27(base_url, campaign, **kwargs):
+        """Generates tracking for N27 (Push/Web notifications)."""
+        return TrackingGenerator._append_params(base_url, TrackingGenerator._n27_params(campaign, **kwargs))
+
+    @staticmethod
+    def _n27_params(campaign, source="APP", product="Entradas", date_str=None, **kwargs):
         """
-        Generates tracking for N27 (Push/Web notifications).
+        Tracking parameters for N27 (Push/Web notifications).
         Format: atr_trk=N27-{YYYYMMDD}_{Campaña}-COM_{DDMMYY}_{Producto}_{Source}_{Campaña}
         """
         today = time.strftime("%Y%m%d")
@@ -55,19 +92,22 @@ class TrackingGenerator:
         # source: app o web (según input, lo pasamos a minúsculas para utm)
         utm_source = source.lower() if source.lower() in ["app", "web"] else "app"
         
-        params = {
+        return {
             "atr_trk": atr_trk,
             "utm_source": utm_source,
             "utm_medium": "push",
             "utm_campaign": campaign
         }
-        
-        return TrackingGenerator._append_params(base_url, params)
 
     @staticmethod
-    def _generate_a2(base_url, campaign, social_network="instagram", **kwargs):
+    def _generate_a2(base_url, campaign, **kwargs):
+        """Generates tracking for A2 (Social Media ads)."""
+        return TrackingGenerator._append_params(base_url, TrackingGenerator._a2_params(campaign, **kwargs))
+
+    @staticmethod
+    def _a2_params(campaign, social_network="instagram", **kwargs):
         """
-        Generates tracking for A2 (Social Media ads).
+        Tracking parameters for A2 (Social Media ads).
         Format: A2-{PlatformCode}-{PlatformName}
         """
         social_network = social_network.lower()
@@ -83,35 +123,49 @@ class TrackingGenerator:
 
         atr_trk = f"A2-{code}-{platform_name}"
         
-        params = {
+        return {
             "atr_trk": atr_trk,
             "utm_source": "meta",
             "utm_medium": "social_cpc",
             "utm_campaign": campaign
         }
-        
-        return TrackingGenerator._append_params(base_url, params)
 
     @staticmethod
     def _append_params(base_url, params):
         """Helper utility to safely append query parameters to a URL."""
-        parsed = urlparse(base_url)
-        query = parse_qs(parsed.query)
-        
-        # Merge de params nuevos
-        for k, v in params.items():
-            query[k] = [v]
-            
-        new_query = urlencode(query, doseq=True)
-        
-        return urlunparse((
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path,
-            parsed.params,
-            new_query,
-            parsed.fragment
-        ))
+        return rewrite(base_url, set_params(params))
+
+
+def iter_url_column(rows):
+    """
+    Yields the URLs of a CSV (any iterable of rows, e.g. a csv.reader).
+    Uses the 'url' column if the first row is a header naming it, otherwise the first column.
+    Blank cells are skipped.
+    """
+    column = 0
+    for i, row in enumerate(rows):
+        if i == 0:
+            names = [cell.strip().lstrip("\ufeff").lower() for cell in row]
+            if "url" in names:
+                column = names.index("url")
+                continue
+        if len(row) > column and row[column].strip():
+            yield row[column].strip()
+
+
+def iter_tracking_csv(results, chunk_size=64 * 1024):
+    """Serializes (original, final) pairs as CSV text, yielded in chunks of about chunk_size characters."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["original", "final"])
+    for row in results:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
 
 
 class ImageResizer:
@@ -125,25 +179,5 @@ class ImageResizer:
         """
         if not url or "atrapalo.com" not in url:
             return url
-            
-        parsed = urlparse(url)
-        query = parse_qs(parsed.query)
-        
-        query["auto"] = ["avif"]
-        query["quality"] = [str(quality)]
-        
-        if width and str(width).strip():
-            query["width"] = [str(width)]
-        else:
-            pass
-            
-        new_query = urlencode(query, doseq=True)
-        
-        return urlunparse((
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path,
-            parsed.params,
-            new_query,
-            parsed.fragment
-        ))
+
+        return rewrite(url, resize_rule(width, quality))
@@ -0,0 +1,170 @@
+"""
+Metrics Module
+Prometheus-style metrics of the web app, exposed as text on /metrics.
+
+- Request timing (init_app): per-route latency and response size histograms,
+  request counts by status and an in-flight gauge, recorded by request hooks.
+- Counters incremented by the pipeline: scraper fetches and parse failures,
+  catalog hits, renders and render stage timings (see instrumentation.span).
+- Collectors: callables passed to render_latest() that read existing stats
+  (parse/URL caches, preview store) only when /metrics is scraped.
+
+Recording is a dict update under a lock, so it adds microseconds per request.
+Values are per process: with several gunicorn workers each one counts its own
+requests, like any in-process Prometheus client without multiprocess mode.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+
+from flask import g, request
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metric name -> (type, help, buckets)
+METRICS = {
+    "nws_http_requests_total": ("counter", "HTTP requests by route, method and status.", None),
+    "nws_http_request_duration_seconds": ("histogram", "HTTP request latency by route.", DURATION_BUCKETS),
+    "nws_http_response_size_bytes": ("histogram", "HTTP response body size by route (known lengths only).", SIZE_BUCKETS),
+    "nws_http_requests_in_flight": ("gauge", "HTTP requests being served.", None),
+    "nws_scraper_fetches_total": ("counter", "Product pages fetched by the scraper, by result.", None),
+    "nws_scraper_parse_failures_total": ("counter", "Scraped products missing a required field.", None),
+    "nws_catalog_lookups_total": ("counter", "Product catalog lookups for new drafts, by result.", None),
+    "nws_renders_total": ("counter", "Newsletter renders by entry point.", None),
+    "nws_render_stage_duration_seconds": ("histogram", "Duration of the render pipeline stages.", DURATION_BUCKETS),
+}
+
+_lock = threading.Lock()
+_values = {name: {} for name in METRICS}
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """Adds to a counter (or gauge)."""
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _values[name]
+        series[key] = series.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    """Records a value in a histogram."""
+    buckets = METRICS[name][2]
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _values[name].get(key)
+        if series is None:
+            series = _values[name][key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        index = bisect_left(buckets, value)
+        if index < len(buckets):
+            series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+
+def reset_metrics():
+    """Clears the recorded values."""
+    with _lock:
+        for series in _values.values():
+            series.clear()
+
+
+# Request hooks
+
+def _route():
+    rule = request.url_rule
+    # Unmatched paths share one label, so 404 scans cannot grow the series
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    inc("nws_http_requests_in_flight")
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    if response.content_length is not None:
+        observe("nws_http_response_size_bytes", response.content_length, route=_route())
+    return response
+
+
+def _teardown_request(exc):
+    # Runs once the body has been sent (after the last chunk for streamed responses)
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    route = _route()
+    status = g.pop("metrics_status", 500)
+    inc("nws_http_requests_in_flight", -1)
+    inc("nws_http_requests_total", route=route, method=request.method, status=str(status))
+    observe("nws_http_request_duration_seconds", time.perf_counter() - start, route=route)
+
+
+def init_app(app):
+    """Registers the request timing hooks on an app."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+# Exposition
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_latest(collectors=()) -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    collectors: callables returning [(name, type, help, [(labels dict, value), ...])],
+    appended after the recorded metrics.
+    """
+    with _lock:
+        snapshot = {
+            name: {key: (dict(value, buckets=list(value["buckets"])) if isinstance(value, dict) else value)
+                   for key, value in series.items()}
+            for name, series in _values.items()
+        }
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(snapshot[name].items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(key, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(key, [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(round(value['sum'], 6))}")
+            lines.append(f"{name}_count{_labels(key)} {value['count']}")
+
+    for collector in collectors:
+        for name, kind, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(sorted(labels.items()))} {_number(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,182 @@
+"""
+Email Optimizer Module
+Optional post-render stage that reduces the weight of the rendered newsletter.
+Gmail clips messages above ~102 KB, hiding the footer and the tracking pixel,
+so the final HTML is measured against a configurable byte budget.
+
+All passes are single regex scans over the document (linear time).
+"""
+
+import re
+
+# Gmail clipping threshold
+GMAIL_CLIP_BYTES = 102 * 1024
+
+# Attributes injected for the visual editor; they have no meaning in the sent email
+EDITOR_ATTRIBUTES = (
+    "contenteditable",
+    "data-editable-spacer",
+    "data-card-container",
+    "data-container-type",
+    "data-base-height",
+    "data-card-row",
+    "data-spacer-id",
+    "data-card-main",
+    "data-floor",
+)
+
+# Blocks whose content must be kept byte for byte
+_PROTECTED_RE = re.compile(r"(<(pre|textarea|script)\b.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+
+# Plain HTML comments. Outlook conditional comments (<!--[if mso]>, <![endif]-->) are kept.
+_COMMENT_RE = re.compile(r"<!--(?!\[if|<!\[endif\]|>).*?-->", re.DOTALL)
+
+_EDITOR_ATTR_RE = re.compile(
+    r"\s(?:%s)(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s>]+))?(?=[\s/>])" % "|".join(EDITOR_ATTRIBUTES),
+    re.IGNORECASE,
+)
+
+_STYLE_ATTR_RE = re.compile(r"\sstyle\s*=\s*(\"[^\"]*\"|'[^']*')", re.IGNORECASE)
+
+# <style id="editor-style"> injected into the preview iframe by the visual editor
+_EDITOR_STYLE_RE = re.compile(
+    r"<style\b[^>]*\bid\s*=\s*[\"']editor-style[\"'][^>]*>.*?</style\s*>", re.IGNORECASE | re.DOTALL
+)
+
+# Opening tags carrying at least one editor attribute
+_EDITOR_TAG_RE = re.compile(
+    r"<[a-zA-Z][^>]*?\s(?:%s)(?=[\s=/>])[^>]*>" % "|".join(EDITOR_ATTRIBUTES), re.IGNORECASE
+)
+
+# Inline declarations the editor sets on its own elements (hover outline, row floors)
+EDITOR_STYLE_PROPERTIES = ("outline", "cursor", "min-height")
+
+# Splits declarations on ';' outside parentheses (e.g. url(...;...))
+_DECLARATION_RE = re.compile(r"(?:[^;(]|\([^)]*\))+")
+
+# Tags around which whitespace is never rendered
+_BLOCK_TAGS = r"html|head|body|meta|link|style|title|table|tbody|thead|tfoot|tr|td|th|div|p|center|br|h[1-6]|ul|ol|li"
+_WS_AFTER_BLOCK_RE = re.compile(r"(</?(?:%s)\b[^>]*>)\s+" % _BLOCK_TAGS, re.IGNORECASE)
+# Anchored at the start of a run, so a long run that is not followed by a tag
+# is tried once instead of once per whitespace character
+_WS_BEFORE_BLOCK_RE = re.compile(r"(?<!\s)\s+(?=</?(?:%s)\b)" % _BLOCK_TAGS, re.IGNORECASE)
+_WS_RUN_RE = re.compile(r"\s{2,}")
+
+
+def strip_editor_attributes(html: str) -> str:
+    """Removes the visual editor attributes (contenteditable, data-card-row...) from the HTML."""
+    return _EDITOR_ATTR_RE.sub("", html)
+
+
+def remove_editor_style(html: str) -> str:
+    """Removes the <style id="editor-style"> block injected by the visual editor."""
+    return _EDITOR_STYLE_RE.sub("", html)
+
+
+def _drop_editor_declarations(match):
+    quoted = match.group(1)
+    quote, body = quoted[0], quoted[1:-1]
+    declarations = [raw.strip() for raw in _DECLARATION_RE.findall(body) if raw.strip()]
+    kept = [raw for raw in declarations if raw.split(":", 1)[0].strip().lower() not in EDITOR_STYLE_PROPERTIES]
+    if len(kept) == len(declarations):
+        return match.group(0)
+    if not kept:
+        return ""
+    return f" style={quote}{'; '.join(kept)};{quote}"
+
+
+def _clean_editor_tag(match):
+    tag = _EDITOR_ATTR_RE.sub("", match.group(0))
+    return _STYLE_ATTR_RE.sub(_drop_editor_declarations, tag)
+
+
+def clean_editor_html(html: str) -> str:
+    """
+    Exports the HTML of the visual editor iframe as clean email HTML: drops the
+    injected editor style, the editor attributes and the outline/cursor/min-height
+    the editor sets inline on its elements. Only the tags that carry editor
+    attributes are rewritten, in one scan of the document.
+    """
+    return _EDITOR_TAG_RE.sub(_clean_editor_tag, remove_editor_style(html))
+
+
+def _compact_style(match):
+    """
+    Rewrites one inline style attribute.
+    Normalizes spacing and keeps only the effective declaration of each property
+    (the last one, unless an earlier one is !important). Declarations are kept
+    inline because many email clients ignore <style> blocks.
+    """
+    quoted = match.group(1)
+    quote, body = quoted[0], quoted[1:-1]
+
+    declarations = {}
+    for raw in _DECLARATION_RE.findall(body):
+        if ":" not in raw:
+            continue
+        prop, value = raw.split(":", 1)
+        prop = prop.strip().lower()
+        value = " ".join(value.split())
+        if not prop or not value:
+            continue
+        previous = declarations.get(prop)
+        if previous and "!important" in previous and "!important" not in value:
+            continue
+        declarations.pop(prop, None)
+        declarations[prop] = value
+
+    if not declarations:
+        return ""
+
+    compact = ";".join(f"{prop}:{value}" for prop, value in declarations.items())
+    return f" style={quote}{compact}{quote}"
+
+
+def compact_inline_styles(html: str) -> str:
+    """Deduplicates and minifies every inline style attribute in the document."""
+    return _STYLE_ATTR_RE.sub(_compact_style, html)
+
+
+def collapse_whitespace(html: str) -> str:
+    """
+    Collapses whitespace runs to a single space and removes whitespace next to block tags.
+    Content of <pre>, <textarea> and <script> is left untouched.
+    """
+    parts = _PROTECTED_RE.split(html)
+    out = []
+    # re.split with 2 groups returns [text, block, tag_name, text, block, tag_name, ...]
+    for i in range(0, len(parts), 3):
+        text = parts[i]
+        text = _COMMENT_RE.sub("", text)
+        text = _WS_AFTER_BLOCK_RE.sub(r"\1", text)
+        text = _WS_BEFORE_BLOCK_RE.sub("", text)
+        text = _WS_RUN_RE.sub(" ", text)
+        out.append(text)
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return "".join(out).strip()
+
+
+def optimize_email_html(html: str, budget_bytes: int = GMAIL_CLIP_BYTES, strip_editor: bool = True):
+    """
+    Runs the full optimization stage on a rendered newsletter.
+    Returns a tuple (optimized_html, report) where report holds the byte sizes
+    before and after, and whether the result fits in the budget.
+    """
+    original_bytes = len(html.encode("utf-8"))
+
+    if strip_editor:
+        html = strip_editor_attributes(html)
+    html = compact_inline_styles(html)
+    html = collapse_whitespace(html)
+
+    final_bytes = len(html.encode("utf-8"))
+    report = {
+        "original_bytes": original_bytes,
+        "final_bytes": final_bytes,
+        "saved_bytes": original_bytes - final_bytes,
+        "budget_bytes": budget_bytes,
+        "headroom_bytes": budget_bytes - final_bytes,
+        "within_budget": final_bytes <= budget_bytes,
+    }
+    return html, report
@@ -0,0 +1,293 @@
+"""
+Preview Store Module
+Keyed store for the visual editor previews, one entry per editor session.
+
+Previews live in memory up to a byte budget; beyond it the least recently used
+entries are spilled to disk (when a spill directory is configured) or dropped.
+Entries expire after a TTL and the total number of sessions is bounded, so
+many editors can work at the same time without overwriting each other.
+
+With shared=True (several worker processes) every preview is written through to
+the spill directory, which becomes the store shared by all workers; memory is
+only a per-process cache validated against the file's modification time.
+The directory holds at most max_entries previews: when a new session is written
+(and every SWEEP_INTERVAL) the expired files are removed, then the least
+recently used ones over the limit.
+A private (non-shared) store spills into its own subdirectory of spill_dir and
+never touches the files of other stores using the same directory.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# Shared mode: seconds between scans of the directory for expired files
+# (also scanned whenever a new session file is created)
+SWEEP_INTERVAL = 300
+
+# Subdirectories of spill_dir owned by private stores
+PRIVATE_PREFIX = "private-"
+
+
+class PreviewStore:
+    """
+    Thread-safe preview store.
+    max_memory_bytes: budget for previews kept in memory.
+    max_entries: maximum number of sessions (memory + disk); oldest are evicted.
+    ttl: seconds since the last write/read after which a preview expires.
+    spill_dir: optional directory for previews pushed out of memory.
+    shared: write-through mode for multi-process servers (requires spill_dir).
+    """
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, max_entries: int = 500,
+                 ttl: float = 12 * 3600, spill_dir: str | None = None, shared: bool = False):
+        if shared and not spill_dir:
+            raise ValueError("A shared preview store needs a spill_dir")
+        self.max_memory_bytes = max_memory_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.shared = shared
+        self._files_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Files of other stores (live workers) are never removed, only expired ones
+            _remove_expired(spill_dir, ttl)
+            for name in os.listdir(spill_dir):
+                path = os.path.join(spill_dir, name)
+                if name.startswith(PRIVATE_PREFIX) and os.path.isdir(path):
+                    _remove_expired(path, ttl)
+                    try:
+                        # Left by a process that stopped spilling long ago (recreated if needed)
+                        if time.time() - os.path.getmtime(path) > ttl:
+                            os.rmdir(path)
+                    except OSError:
+                        pass
+            if not shared:
+                self._files_dir = os.path.join(spill_dir, f"{PRIVATE_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+                os.makedirs(self._files_dir, exist_ok=True)
+
+        # key -> {"html": str | None, "size": int, "touched": float}; html None = spilled
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.spills = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # Disk spill
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self._files_dir, f"{key}.html")
+
+    def _write(self, key: str, html: str) -> int:
+        """Writes a preview file atomically and returns its mtime (ns)."""
+        path = self._spill_path(key)
+        os.makedirs(self._files_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+        return os.stat(path).st_mtime_ns
+
+    def _spill(self, key: str, entry: dict):
+        """Moves an entry's HTML from memory to disk (or drops it without spill dir)."""
+        if self.spill_dir:
+            if not self.shared:
+                self._write(key, entry["html"])
+            self._memory_bytes -= entry["size"]
+            entry["html"] = None
+            self.spills += 1
+        else:
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str, keep_file: bool = False):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry["html"] is not None:
+            self._memory_bytes -= entry["size"]
+        has_file = self.shared or (entry is not None and entry["html"] is None)
+        if self.spill_dir and has_file and not keep_file:
+            try:
+                os.remove(self._spill_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _sweep_files(self):
+        """
+        Shared mode: removes the expired preview files of every worker, then the least
+        recently written/read ones (oldest mtime) beyond max_entries.
+        """
+        self._last_sweep = time.time()
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(".html"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        files.sort()
+        live = [item for item in files if self._last_sweep - item[0] <= self.ttl]
+        surplus = files[:len(files) - len(live) + max(len(live) - self.max_entries, 0)]
+        for mtime, path in surplus:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            if self._last_sweep - mtime <= self.ttl:
+                self.evictions += 1
+
+    def _enforce_limits(self):
+        """Evicts expired and surplus entries, then spills the LRU ones over the memory budget."""
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if now - e["touched"] > self.ttl]:
+            # Shared: another worker may have renewed the file, the disk sweep decides
+            self._remove(key, keep_file=self.shared)
+            self.expirations += 1
+
+        while len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            # Shared files may still be in use by other workers: they expire by TTL
+            self._remove(key, keep_file=self.shared)
+            self.evictions += 1
+
+        if self._memory_bytes > self.max_memory_bytes:
+            for key, entry in list(self._entries.items()):
+                if self._memory_bytes <= self.max_memory_bytes:
+                    break
+                if entry["html"] is not None:
+                    self._spill(key, entry)
+
+    # Public API
+
+    def put(self, key: str, html: str):
+        """Stores (or replaces) the preview of a session."""
+        with self._lock:
+            self._remove(key, keep_file=self.shared)
+            size = len(html.encode("utf-8"))
+            entry = {"html": html, "size": size, "touched": time.time()}
+            if self.shared:
+                is_new = not os.path.exists(self._spill_path(key))
+                entry["mtime"] = self._write(key, html)
+                if is_new or entry["touched"] - self._last_sweep > SWEEP_INTERVAL:
+                    self._sweep_files()
+            self._entries[key] = entry
+            self._memory_bytes += size
+            self._enforce_limits()
+
+    def get(self, key: str) -> str | None:
+        """Returns the preview of a session (reloading it from disk if spilled) or None."""
+        with self._lock:
+            if self.shared:
+                return self._get_shared(key)
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["touched"] > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                return None
+
+            entry["touched"] = time.time()
+            self._entries.move_to_end(key)
+            if entry["html"] is not None:
+                return entry["html"]
+
+            try:
+                with open(self._spill_path(key), "r", encoding="utf-8") as f:
+                    html = f.read()
+            except FileNotFoundError:
+                self._entries.pop(key, None)
+                return None
+
+            # Back to memory as the most recently used entry
+            entry["html"] = html
+            self._memory_bytes += entry["size"]
+            os.remove(self._spill_path(key))
+            self._enforce_limits()
+            return html
+
+    def _get_shared(self, key: str) -> str | None:
+        """get() in shared mode: the file is the source of truth, memory a cache."""
+        path = self._spill_path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._remove(key, keep_file=True)
+            return None
+        if time.time() - stat.st_mtime > self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None or entry["html"] is None or entry["mtime"] != stat.st_mtime_ns:
+            # Unknown here, pushed out of memory or rewritten by another worker
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+            self._remove(key, keep_file=True)
+            entry = {"html": html, "size": len(html.encode("utf-8")), "touched": 0}
+            self._entries[key] = entry
+            self._memory_bytes += entry["size"]
+
+        # Renews the expiry for every worker
+        os.utime(path)
+        entry["mtime"] = os.stat(path).st_mtime_ns
+        entry["touched"] = time.time()
+        self._entries.move_to_end(key)
+        html = entry["html"]
+        self._enforce_limits()
+        return html
+
+    def delete(self, key: str):
+        """Removes the preview of a session."""
+        with self._lock:
+            self._remove(key)
+
+    def purge(self):
+        """Drops expired previews (also done on every write), including shared files."""
+        with self._lock:
+            self._enforce_limits()
+            if self.shared:
+                self._sweep_files()
+
+    def __contains__(self, key):
+        with self._lock:
+            if self.shared:
+                try:
+                    return time.time() - os.path.getmtime(self._spill_path(key)) <= self.ttl
+                except FileNotFoundError:
+                    return False
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry["touched"] <= self.ttl
+
+    def stats(self) -> dict:
+        """Size and eviction counters of the store."""
+        with self._lock:
+            spilled = sum(1 for e in self._entries.values() if e["html"] is None)
+            return {
+                "sessions": len(self._entries),
+                "in_memory": len(self._entries) - spilled,
+                "spilled": spilled,
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "spills": self.spills,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def _remove_expired(directory: str, ttl: float):
+    """Removes the preview files of a directory not written or read for ttl seconds."""
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".html") and now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
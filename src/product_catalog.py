@@ -0,0 +1,136 @@
+"""
+Product Catalog Module
+Local SQLite catalog of scraped products, keyed by canonical product URL
+(urls.canonical_url), with the latest scraped fields and when they were fetched.
+
+The catalog is a cache, not the source of truth of the drafts: new drafts reuse
+recently fetched products (see fresh()) instead of scraping them again, and
+/api/drafts/refresh writes the products it rescrapes. Drafts keep a full snapshot
+of each item (snapshot_items() adds the "ref" key, the product key, next to it;
+draft_items() drops it again), so a draft reads the same with the catalog deleted
+and does not change when a later scrape updates the product.
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+from .urls import canonical_url
+
+# Fields taken from the scraper (the product); everything else belongs to the draft
+CATALOG_FIELDS = ("url", "title", "metadata_1", "metadata_2", "description", "image",
+                  "discount", "price_old", "price", "tag", "rating", "cta")
+
+# Products fetched less than this many seconds ago are reused by new drafts
+CATALOG_MAX_AGE = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    url TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+)
+"""
+
+
+def snapshot_items(items) -> list:
+    """Draft items as stored on disk: full copies, with the product key ("ref") of those with a URL."""
+    snapshots = []
+    for item in items:
+        if not isinstance(item, dict):
+            snapshots.append(item)
+            continue
+        key = canonical_url(str(item.get("url") or ""))
+        snapshot = {field: value for field, value in item.items() if field != "ref"}
+        if key:
+            snapshot = {"ref": key, **snapshot}
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def draft_items(items) -> list:
+    """Draft items as used by the app (review form, render, export): snapshots without "ref"."""
+    return [{field: value for field, value in item.items() if field != "ref"} if isinstance(item, dict) else item
+            for item in items]
+
+
+class ProductCatalog:
+    """
+    Catalog stored in db_path. A connection is opened per operation, so the catalog
+    can be shared by threads and worker processes (WAL journal).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return _Connection(self.db_path)
+
+    def put(self, url: str, data: dict, fetched_at: float | None = None) -> str:
+        """Stores the scraped fields of a product (replacing older ones); returns its key."""
+        key = canonical_url(url)
+        if not key:
+            return ""
+        fields = {field: data[field] for field in CATALOG_FIELDS if field in data}
+        fields.setdefault("url", url)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO products (url, data, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(fields, ensure_ascii=False), fetched_at or time.time()),
+            )
+        return key
+
+    def get_many(self, urls) -> dict:
+        """{key: {"data": {...}, "fetched_at": float}} for the URLs in the catalog."""
+        keys = list({canonical_url(url) for url in urls if url})
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT url, data, fetched_at FROM products WHERE url IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, data, fetched_at in rows:
+                    found[key] = {"data": json.loads(data), "fetched_at": fetched_at}
+        return found
+
+    def get(self, url: str) -> dict | None:
+        return self.get_many([url]).get(canonical_url(url))
+
+    def fresh(self, url: str, max_age: float = CATALOG_MAX_AGE) -> dict | None:
+        """Scraped fields of a product fetched less than max_age seconds ago, or None."""
+        entry = self.get(url)
+        if entry is None or time.time() - entry["fetched_at"] > max_age:
+            return None
+        return dict(entry["data"])
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            products, = conn.execute("SELECT COUNT(*) FROM products").fetchone()
+        return {"products": products, "bytes": os.path.getsize(self.db_path)}
+
+
+class _Connection:
+    """sqlite3 connection that commits (or rolls back) and closes on exit."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=10)
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+        return False
@@ -5,12 +5,22 @@ Includes utility functions for UTM tracking injection and campaign name normaliz
 """
 
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 from .csv_parser import csv_to_newsletter_dict
+from .optimizer import optimize_email_html, GMAIL_CLIP_BYTES
+from .instrumentation import instrumented, byte_size
+from .urls import rewrite, utm_rule, parse_url, set_params, drop_params
+from .marketing import ImageResizer
 
 import re
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
 import unicodedata
+from html import escape, unescape
+from urllib.parse import urlparse
 
 
 # Configuration
@@ -20,13 +30,19 @@ TEMPLATES_DIR = BASE_DIR / "templates"
 OUTPUT_DIR = BASE_DIR / "output"
 
 
+@lru_cache(maxsize=1)
 def get_jinja_env() -> Environment:
     """
     Configura el entorno Jinja2 para leer plantillas desde /templates.
+    The environment is built once per process so compiled templates are reused,
+    and the bytecode is cached on disk to be shared by worker processes. Jinja's
+    default cache directory is private to the user (0700, ownership checked), so
+    other local users cannot plant bytecode in it.
     """
     env = Environment(
         loader=FileSystemLoader(str(TEMPLATES_DIR)),
         autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=FileSystemBytecodeCache(),
     )
     return env
 
@@ -57,16 +73,158 @@ def render_newsletter_from_csv(csv_path: str, output_path: str | None = None) ->
 
 # Dictionary Rendering
 
+@instrumented("render", input_size=lambda newsletter_data: len(newsletter_data.get("cards") or []))
 def render_newsletter(newsletter_data: dict) -> str:
     """
     Renders the newsletter using a pre-prepared data dictionary.
-    Used by the visual editor and direct JSON flows.
+    Cards may be csv_parser.Card objects or plain dicts (e.g. loaded from JSON).
+    Parsed cards are not JSON-serializable as such: dump the dict with
+    default=csv_parser.json_default (or use Card.to_dict()).
     """
     env = get_jinja_env()
     template = env.get_template("newsletter_master.html")
     return template.render(newsletter=newsletter_data)
 
 
+# Multi-variant Rendering
+
+def merge_variant(base_data: dict, variant: dict) -> dict:
+    """
+    Builds the newsletter dictionary for a single variant.
+    Top-level keys override the base data; 'header' and 'footer' are merged key by key
+    so a variant can change e.g. only the preheader. The 'name' key is metadata only.
+    """
+    data = dict(base_data)
+    for key, value in variant.items():
+        if key == "name":
+            continue
+        if key in ("header", "footer") and isinstance(value, dict):
+            merged = dict(base_data.get(key) or {})
+            merged.update(value)
+            data[key] = merged
+        else:
+            data[key] = value
+    return data
+
+
+def _variant_filename(name: str) -> str:
+    """Turns a variant name into a safe output filename."""
+    slug = re.sub(r"[^a-z0-9_-]+", "-", normalize_campaign_name(name)).strip("-")
+    return f"{slug or 'variant'}.html"
+
+
+def _warm_template_cache():
+    """Worker initializer: compiles the master template once per process."""
+    get_jinja_env().get_template("newsletter_master.html")
+
+
+def _render_variant(job):
+    """
+    Worker task for render_many.
+    Renders one variant, applies the post-processing stages selected in its options
+    (responsive images, email-weight optimization), writes it to disk and returns
+    its timing entry.
+    """
+    name, data, output_path, options = job
+    start = time.perf_counter()
+    html = render_newsletter(data)
+    if options["responsive"]:
+        html = apply_responsive_images(html)
+    optimization = None
+    if options["optimize"]:
+        html, optimization = optimize_email_html(html, budget_bytes=options["budget_bytes"])
+    render_ms = (time.perf_counter() - start) * 1000
+
+    out = Path(output_path)
+    out.write_text(html, encoding="utf-8")
+
+    return {
+        "name": name,
+        "output": str(out),
+        "bytes": len(html.encode("utf-8")),
+        "render_ms": round(render_ms, 2),
+        "optimization": optimization,
+    }
+
+
+def _render_jobs(entries, out_dir: Path, options: dict):
+    """
+    Turns (name, data) pairs into worker jobs with unique output filenames.
+    Lazy, so entries can still be parsed while the first jobs are rendering.
+    """
+    used_names = set()
+    for i, (name, data) in enumerate(entries, start=1):
+        filename = _variant_filename(name)
+        if filename in used_names:
+            filename = f"{filename[:-5]}-{i}.html"
+        used_names.add(filename)
+        yield (name, data, str(out_dir / filename), options)
+
+
+def _run_render_jobs(jobs, out_dir: Path, max_workers: int | None) -> dict:
+    """
+    Renders the jobs (inline for a single one, otherwise in worker processes, submitting
+    each job as soon as it is produced), writes 'render_report.json' and returns the report.
+    """
+    jobs = iter(jobs)
+    start = time.perf_counter()
+    first = list(islice(jobs, 2))
+    if len(first) <= 1:
+        results = [_render_variant(job) for job in first]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_template_cache) as pool:
+            futures = [pool.submit(_render_variant, job) for job in chain(first, jobs)]
+            results = [future.result() for future in futures]
+    total_ms = (time.perf_counter() - start) * 1000
+
+    report = {
+        "variants": results,
+        "count": len(results),
+        "total_ms": round(total_ms, 2),
+        "output_dir": str(out_dir),
+    }
+    with open(out_dir / "render_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+
+    return report
+
+
+def render_many(base_data: dict, variants: list, output_dir: str | None = None, max_workers: int | None = None,
+                optimize: bool = False, budget_bytes: int = GMAIL_CLIP_BYTES, responsive: bool = False) -> dict:
+    """
+    Renders several variants of the same campaign in parallel worker processes.
+    Each variant is a dict of overrides (see merge_variant) with an optional 'name'.
+    With optimize=True every output goes through the email-weight optimizer, with
+    responsive=True card and banner images are resized for their slot.
+    Every output is written to output_dir and a timing report is saved next to them
+    as 'render_report.json'. Returns the report.
+    """
+    out_dir = Path(output_dir) if output_dir else OUTPUT_DIR / "variants"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = (
+        (variant.get("name") or f"variant-{i}", merge_variant(base_data, variant))
+        for i, variant in enumerate(variants, start=1)
+    )
+    options = {"optimize": optimize, "budget_bytes": budget_bytes, "responsive": responsive}
+    return _run_render_jobs(_render_jobs(entries, out_dir, options), out_dir, max_workers)
+
+
+def render_campaigns(campaigns, output_dir: str | None = None, max_workers: int | None = None,
+                     optimize: bool = False, budget_bytes: int = GMAIL_CLIP_BYTES, responsive: bool = False) -> dict:
+    """
+    Renders independent campaigns (an iterable of (name, newsletter_data) pairs, e.g.
+    csv_parser.iter_newsletter_sections) in parallel worker processes.
+    Each campaign is handed to the pool as soon as it is available, so parsing the rest
+    of a multi-campaign file overlaps with rendering. Same report as render_many.
+    """
+    out_dir = Path(output_dir) if output_dir else OUTPUT_DIR / "campaigns"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    options = {"optimize": optimize, "budget_bytes": budget_bytes, "responsive": responsive}
+    return _run_render_jobs(_render_jobs(campaigns, out_dir, options), out_dir, max_workers)
+
+
 # Normalization
 
 def normalize_campaign_name(name: str) -> str:
@@ -94,31 +252,59 @@ def add_utm_params(url: str, campaign: str, content: str) -> str:
     Appends UTM parameters to a URL while preserving existing query parameters.
     Handles 'atr_trk' preservation and prevents duplicate UTMs.
     """
-    parsed = urlparse(url)
-    query = parse_qs(parsed.query)
+    return rewrite(url, utm_rule(campaign, content))
 
-    # UTMs base
-    query["utm_source"] = ["atrapalo"]
-    query["utm_medium"] = ["newsletter"]
-    query["utm_campaign"] = [campaign]
-    query["utm_content"] = [content]
 
-    new_query = urlencode(query, doseq=True)
+# HTML Tracking
 
-    clean_url = urlunparse((
-        parsed.scheme,
-        parsed.netloc,
-        parsed.path,
-        parsed.params,
-        new_query,
-        parsed.fragment
-    ))
+_HREF_RE = re.compile(r'href="([^"]+)"')
 
-    return clean_url
 
+def link_context(url: str, before: str) -> str:
+    """
+    Identifies the block a link belongs to (used as 'utm_content' and in link reports)
+    from the HTML right before it and the URL itself.
+    """
+    if "single_card_block" in before:
+        return "card"
+    elif "hero" in before or "HEADER" in before:
+        return "hero"
+    elif "recomendaciones" in before:
+        return "cta-recom"
+    elif "banner" in before:
+        return "banner"
+    elif "atrapalo-app" in url:
+        return "app"
+    elif "houdinis" in url:
+        return "social-houdinis"
+    elif "facebook" in url:
+        return "social-facebook"
+    elif "instagram" in url:
+        return "social-instagram"
+    elif "twitter" in url:
+        return "social-twitter"
+    elif "youtube" in url:
+        return "social-youtube"
+    elif "atrapalo.com" in url:
+        return "logo"
+    else:
+        return "link"
+
+
+def _is_trackable(url: str) -> bool:
+    """Excludes mailto, tel and anchor links."""
+    return not url.startswith(("mailto:", "tel:", "#"))
+
+
+def iter_links(html: str):
+    """Yields (url, context) for every trackable href of the HTML, in document order."""
+    for match in _HREF_RE.finditer(html):
+        url = match.group(1)
+        if _is_trackable(url):
+            yield url, link_context(url, html[max(0, match.start() - 200):match.start()])
 
-# HTML Tracking
 
+@instrumented("utm_tracking", input_size=lambda html, campaign_name: byte_size(html))
 def apply_utm_tracking(html: str, campaign_name: str) -> str:
     """
     Parses the entire HTML output and injects UTM tracking into all links.
@@ -131,39 +317,90 @@ def apply_utm_tracking(html: str, campaign_name: str) -> str:
         url = match.group(1)
 
         # excluir mailto, tel, anclas
-        if url.startswith(("mailto:", "tel:", "#")):
+        if not _is_trackable(url):
             return f'href="{url}"'
 
         # detectar tipo
         before = match.string[max(0, match.start()-200):match.start()]
-
-        if "single_card_block" in before:
-            content = "card"
-        elif "hero" in before or "HEADER" in before:
-            content = "hero"
-        elif "recomendaciones" in before:
-            content = "cta-recom"
-        elif "banner" in before:
-            content = "banner"
-        elif "atrapalo-app" in url:
-            content = "app"
-        elif "houdinis" in url:
-            content = "social-houdinis"
-        elif "facebook" in url:
-            content = "social-facebook"
-        elif "instagram" in url:
-            content = "social-instagram"
-        elif "twitter" in url:
-            content = "social-twitter"
-        elif "youtube" in url:
-            content = "social-youtube"
-        elif "atrapalo.com" in url:
-            content = "logo"
-        else:
-            content = "link"
+        content = link_context(url, before)
 
         # añdir utms
         tracked = add_utm_params(url, campaign, content)
         return f'href="{tracked}"'
 
-    return re.sub(r'href="([^"]+)"', replacer, html)
+    return _HREF_RE.sub(replacer, html)
+
+
+# Responsive Images
+
+# Display width (px) of each image slot in the templates
+CARD_SLOT_WIDTH = 288      # single_card_block.html card table
+CONTAINER_WIDTH = 600      # newsletter_master.html max-width (header, banners)
+# Requested width = slot width x density (2x for high-density screens), capped
+IMAGE_DENSITY = 2
+MAX_IMAGE_WIDTH = 1200
+IMAGE_QUALITY = 75
+# Hosts served by the resizing CDN; static template assets are already exported at their final size
+RESPONSIVE_HOSTS = ("cdn.atrapalo.com",)
+RESPONSIVE_SKIP = ("/assets/",)
+
+_IMG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_IMG_SRC_RE = re.compile(r'\bsrc="([^"]+)"', re.IGNORECASE)
+_IMG_WIDTH_ATTR_RE = re.compile(r'\bwidth="(\d+)"', re.IGNORECASE)
+_IMG_WIDTH_STYLE_RE = re.compile(r"(?<![-\w])width\s*:\s*(\d+)px", re.IGNORECASE)
+
+
+def _image_slot_width(tag: str, before: str) -> int:
+    """
+    Display width of an <img>: its width attribute or fixed CSS width if present,
+    otherwise the width of the block it fills (a card or the 600px container).
+    """
+    match = _IMG_WIDTH_ATTR_RE.search(tag) or _IMG_WIDTH_STYLE_RE.search(tag)
+    if match:
+        return int(match.group(1))
+    if "data-card-main" in before:
+        return CARD_SLOT_WIDTH
+    return CONTAINER_WIDTH
+
+
+@lru_cache(maxsize=4096)
+def responsive_image_url(url: str, slot_width: int, density: int = IMAGE_DENSITY,
+                         quality: int = IMAGE_QUALITY) -> str:
+    """
+    CDN URL of an image sized for a slot (cached per URL and width). A height already
+    in the URL is scaled with the width, so the CDN keeps the aspect ratio; without a
+    width to scale from, the height is dropped.
+    """
+    width = min(slot_width * density, MAX_IMAGE_WIDTH)
+    resized = ImageResizer.resize_atrapalo_url(url, width=width, quality=quality)
+    query = dict(parse_url(url)[4])
+    if resized == url or "height" not in query:
+        return resized
+    try:
+        height = round(int(query["height"][0]) * width / int(query["width"][0]))
+    except (KeyError, ValueError, ZeroDivisionError):
+        return rewrite(resized, drop_params("height"))
+    return rewrite(resized, set_params({"height": max(height, 1)}))
+
+
+@instrumented("responsive_images", input_size=lambda html, **kwargs: byte_size(html))
+def apply_responsive_images(html: str, density: int = IMAGE_DENSITY, quality: int = IMAGE_QUALITY) -> str:
+    """
+    Rewrites every Atrápalo CDN image in the rendered HTML to the width of its slot
+    (x density for high-density screens) and the given quality through the CDN resizer,
+    instead of serving the full-resolution originals.
+    """
+    def replacer(match):
+        tag = match.group(0)
+        src = _IMG_SRC_RE.search(tag)
+        if not src:
+            return tag
+        url = unescape(src.group(1))
+        if urlparse(url).netloc not in RESPONSIVE_HOSTS or any(p in url for p in RESPONSIVE_SKIP):
+            return tag
+
+        before = match.string[max(0, match.start() - 600):match.start()]
+        resized = responsive_image_url(url, _image_slot_width(tag, before), density, quality)
+        return tag[:src.start(1)] + escape(resized, quote=True) + tag[src.end(1):]
+
+    return _IMG_RE.sub(replacer, html)
@@ -9,6 +9,11 @@ from bs4 import BeautifulSoup
 import json
 import re
 
+from .metrics import inc
+
+# Fields every product page should yield; a missing one counts as a parse failure
+REQUIRED_FIELDS = ("title", "image", "price")
+
 
 def get_atrapalo_data(url):
     """
@@ -22,16 +27,24 @@ def get_atrapalo_data(url):
     try:
         response = requests.get(url, headers=headers, timeout=10)
         if response.status_code != 200:
+            inc("nws_scraper_fetches_total", result="http_error")
             return None
             
         soup = BeautifulSoup(response.content, 'html.parser')
         
         if "/hoteles/" in url:
-            return parse_hotel(soup, url)
+            data = parse_hotel(soup, url)
         else:
-            return parse_activity(soup, url)
+            data = parse_activity(soup, url)
+
+        inc("nws_scraper_fetches_total", result="ok")
+        for field in REQUIRED_FIELDS:
+            if not data.get(field):
+                inc("nws_scraper_parse_failures_total", field=field)
+        return data
 
     except Exception as e:
+        inc("nws_scraper_fetches_total", result="error")
         print(f"Error scraping {url}: {e}")
         return None
 
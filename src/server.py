@@ -0,0 +1,104 @@
+"""
+Server Module
+Production launcher for the web app (no debug, no reloader).
+
+Runs several worker processes with gunicorn where it is available (Linux/macOS),
+otherwise a multi-threaded waitress server (Windows), and as a last resort the
+threaded Flask server. Settings come from config.load_config (NWS_* variables)
+and can be overridden on the command line:
+
+    python -m src.server --host 0.0.0.0 --port 8000 --workers 4 --threads 8
+
+gunicorn can also be used directly: gunicorn -w 4 --threads 8 "src.webapp:create_app()"
+(editor previews are shared through disk by default, so any worker count works).
+"""
+
+import os
+import argparse
+import logging
+
+from .config import load_config
+from .webapp import create_app
+
+logger = logging.getLogger("nws.server")
+
+# Scraping a draft waits between product pages: requests can take minutes
+REQUEST_TIMEOUT = 600
+
+
+def serve_gunicorn(config: dict):
+    """Pre-fork server: one app (and one set of in-process caches) per worker."""
+    from gunicorn.app.base import BaseApplication
+
+    class NewsletterApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{config['HOST']}:{config['PORT']}")
+            self.cfg.set("workers", config["WORKERS"])
+            self.cfg.set("threads", config["THREADS"])
+            self.cfg.set("timeout", REQUEST_TIMEOUT)
+            self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return create_app(config)
+
+    NewsletterApplication().run()
+
+
+def serve_waitress(config: dict):
+    """Single process, THREADS worker threads."""
+    from waitress import serve
+    serve(create_app(config), host=config["HOST"], port=config["PORT"],
+          threads=config["THREADS"], channel_timeout=REQUEST_TIMEOUT)
+
+
+def serve_flask(config: dict):
+    """Fallback: Werkzeug's threaded server."""
+    logger.warning("gunicorn/waitress no instalados: usando el servidor de Flask (pip install waitress)")
+    create_app(config).run(host=config["HOST"], port=config["PORT"], threaded=True)
+
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def serve(overrides: dict | None = None):
+    """Picks the best available server for the platform and runs the app."""
+    config = load_config(overrides)
+
+    if os.name != "nt" and _available("gunicorn"):
+        backend = serve_gunicorn
+    else:
+        if config["WORKERS"] > 1:
+            logger.warning("Varios procesos requieren gunicorn: se usan %s hilos en un proceso",
+                           config["WORKERS"] * config["THREADS"])
+            config = load_config(dict(overrides or {}, WORKERS=1, THREADS=config["WORKERS"] * config["THREADS"]))
+        backend = serve_waitress if _available("waitress") else serve_flask
+
+    logger.info("Servidor %s en http://%s:%s (%s procesos x %s hilos)", backend.__name__.split("_")[1],
+                config["HOST"], config["PORT"], config["WORKERS"], config["THREADS"])
+    backend(config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de producción del automatizador de newsletters")
+    parser.add_argument("--host", help="Interfaz (NWS_HOST, por defecto 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="Puerto (NWS_PORT, por defecto 5000)")
+    parser.add_argument("-w", "--workers", type=int, help="Procesos (NWS_WORKERS, por defecto 1)")
+    parser.add_argument("-t", "--threads", type=int, help="Hilos por proceso (NWS_THREADS, por defecto 8)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    overrides = {
+        key: value for key, value in
+        (("HOST", args.host), ("PORT", args.port), ("WORKERS", args.workers), ("THREADS", args.threads))
+        if value is not None
+    }
+    serve(overrides)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Share Store Module
+Content-addressed storage for the shareable preview links of the visual editor.
+
+Each preview is stored once, gzip-compressed, under the SHA-256 of its HTML, so
+sharing the same newsletter twice returns the same link. A shared preview never
+changes, which lets it be served with a strong ETag and long-lived cache headers.
+Previews expire TTL seconds after they were last shared and, when the directory
+exceeds its size budget, the oldest ones are removed first.
+"""
+
+import os
+import re
+import gzip
+import time
+import hashlib
+import threading
+
+SHARE_TTL = 30 * 24 * 3600
+SHARE_MAX_BYTES = 200 * 1024 * 1024
+GC_INTERVAL = 300
+
+DIGEST_LENGTH = 32
+_DIGEST_RE = re.compile(rf"[0-9a-f]{{{DIGEST_LENGTH}}}")
+
+
+class ShareStore:
+    """
+    Share previews stored as <digest>.html.gz in root_dir.
+    ttl: seconds since the last share after which a preview is removed.
+    max_bytes: budget for the whole directory (compressed size).
+    Legacy uncompressed '*.html' previews in the same directory are also collected.
+    """
+
+    def __init__(self, root_dir: str, ttl: float = SHARE_TTL, max_bytes: int = SHARE_MAX_BYTES,
+                 gc_interval: float = GC_INTERVAL):
+        self.root_dir = root_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        os.makedirs(root_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(html: str) -> str:
+        return hashlib.sha256(html.encode("utf-8")).hexdigest()[:DIGEST_LENGTH]
+
+    @staticmethod
+    def is_digest(value: str) -> bool:
+        return bool(_DIGEST_RE.fullmatch(value))
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root_dir, f"{digest}.html.gz")
+
+    def put(self, html: str) -> str:
+        """
+        Stores a preview and returns its digest. An identical preview already
+        stored is not written again, only its expiry is renewed.
+        """
+        digest = self.digest(html)
+        path = self._path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                # mtime=0 keeps the compressed bytes identical for identical HTML
+                data = gzip.compress(html.encode("utf-8"), compresslevel=9, mtime=0)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        self.collect(force=False)
+        return digest
+
+    def get_compressed(self, digest: str) -> bytes | None:
+        """Returns the gzip bytes of a preview, or None if unknown or expired."""
+        if not self.is_digest(digest):
+            return None
+        path = self._path(digest)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, digest: str) -> str | None:
+        """Returns the HTML of a preview, or None if unknown or expired."""
+        data = self.get_compressed(digest)
+        return gzip.decompress(data).decode("utf-8") if data is not None else None
+
+    def _files(self) -> list:
+        """(mtime, size, path) of every stored preview, oldest first."""
+        files = []
+        for entry in os.scandir(self.root_dir):
+            if entry.is_file() and entry.name.endswith((".html.gz", ".html")):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        return files
+
+    def collect(self, force: bool = True) -> dict:
+        """
+        Removes expired previews, then the oldest ones until the directory fits
+        max_bytes. Without force it runs at most once every gc_interval seconds.
+        """
+        now = time.time()
+        removed = {"expired": 0, "over_budget": 0}
+        with self._lock:
+            if not force and now - self._last_gc < self.gc_interval:
+                return removed
+            self._last_gc = now
+
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            for mtime, size, path in files:
+                if now - mtime > self.ttl:
+                    reason = "expired"
+                elif total > self.max_bytes:
+                    reason = "over_budget"
+                else:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed[reason] += 1
+        return removed
+
+    def stats(self) -> dict:
+        files = self._files()
+        return {
+            "previews": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
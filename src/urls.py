@@ -0,0 +1,154 @@
+"""
+URLs Module
+Shared URL rewriting for every tracking path: newsletter UTMs (renderer), channel
+tracking (marketing), scraper 'atr_trk' links (webapp) and CDN image resizing.
+
+A rewrite is a URL plus a sequence of rules. Rules are hashable tuples built with
+the helpers below and are applied in order over the parsed query:
+
+    rewrite(url, utm_rule("black-friday", "card"))
+    rewrite(url, set_params({"atr_trk": "A2-3589-Instagram"}), strip_query=True)
+
+Parsing and rewriting are memoized (LRU), so the product URLs that appear again and
+again in newsletters and drafts are only parsed and rebuilt once. Bulk batches of
+mostly distinct URLs gain nothing from the caches and pay for their bookkeeping, so
+they rewrite with cached=False.
+Query semantics are those of parse_qs/urlencode: existing keys keep their position,
+new keys are appended, blank values are dropped.
+"""
+
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse, quote_plus
+
+# Entries kept by each memoization layer
+URL_CACHE_SIZE = 8192
+
+
+# Rules
+
+def set_params(params: dict) -> tuple:
+    """Rule: sets (replaces) query parameters."""
+    return ("set", tuple((key, str(value)) for key, value in params.items()))
+
+
+def drop_params(*keys: str) -> tuple:
+    """Rule: removes query parameters."""
+    return ("drop", keys)
+
+
+def raw_param(key: str, value: str) -> tuple:
+    """Rule: sets a parameter whose value is emitted verbatim (not percent-encoded)."""
+    return ("raw", key, value)
+
+
+def utm_rule(campaign: str, content: str, source: str = "atrapalo", medium: str = "newsletter") -> tuple:
+    """Rule: newsletter UTM parameters."""
+    return set_params({
+        "utm_source": source,
+        "utm_medium": medium,
+        "utm_campaign": campaign,
+        "utm_content": content,
+    })
+
+
+def resize_rule(width=None, quality=75) -> tuple:
+    """Rule: Atrápalo CDN resizing (AVIF, quality and optional width)."""
+    params = {"auto": "avif", "quality": quality}
+    if width and str(width).strip():
+        params["width"] = width
+    return set_params(params)
+
+
+# Parse / serialize
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def parse_url(url: str) -> tuple:
+    """
+    Parses a URL once: returns (scheme, netloc, path, params, query, fragment) where
+    query is a tuple of (key, values) pairs as produced by parse_qs.
+    """
+    parsed = urlparse(url)
+    query = tuple((key, tuple(values)) for key, values in parse_qs(parsed.query).items())
+    return (parsed.scheme, parsed.netloc, parsed.path, parsed.params, query, parsed.fragment)
+
+
+def _serialize(parts: tuple, query: dict, raw: dict) -> str:
+    """Rebuilds a URL from its parsed parts and the rewritten query."""
+    encoded = urlencode(query, doseq=True)
+    if raw:
+        raw_query = "&".join(f"{quote_plus(key)}={value}" for key, value in raw.items())
+        encoded = f"{encoded}&{raw_query}" if encoded else raw_query
+
+    scheme, netloc, path, params, _, fragment = parts
+    return urlunparse((scheme, netloc, path, params, encoded, fragment))
+
+
+def _apply_rules(url: str, rules: tuple, strip_query: bool, parse) -> str:
+    if strip_query:
+        url = url.split("?")[0]
+
+    parts = parse(url)
+    query = dict(parts[4])
+    raw = {}
+
+    for rule in rules:
+        if rule[0] == "set":
+            for key, value in rule[1]:
+                raw.pop(key, None)
+                query[key] = (value,)
+        elif rule[0] == "raw":
+            query.pop(rule[1], None)
+            raw[rule[1]] = rule[2]
+        elif rule[0] == "drop":
+            for key in rule[1]:
+                query.pop(key, None)
+                raw.pop(key, None)
+        else:
+            raise ValueError(f"Unknown URL rule: {rule[0]!r}")
+
+    return _serialize(parts, query, raw)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _rewrite(url: str, rules: tuple, strip_query: bool) -> str:
+    return _apply_rules(url, rules, strip_query, parse_url)
+
+
+def rewrite(url: str, *rules, strip_query: bool = False, cached: bool = True) -> str:
+    """
+    Applies the rules to a URL and returns the rebuilt URL.
+    strip_query=True first drops everything from the first '?' (url.split('?')[0]).
+    cached=False skips the memoization layers (batches of mostly distinct URLs).
+    """
+    if not cached:
+        return _apply_rules(url, rules, strip_query, parse_url.__wrapped__)
+    return _rewrite(url, rules, strip_query)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def canonical_url(url: str) -> str:
+    """
+    Identity of a product page, used to match the same offer across drafts:
+    lowercase scheme and host, no query (tracking) or fragment, no trailing slash.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    scheme, netloc, path, _, _, _ = parse_url(url.split("#")[0].split("?")[0])
+    return urlunparse((scheme.lower(), netloc.lower(), path.rstrip("/"), "", "", ""))
+
+
+def url_cache_stats() -> dict:
+    """Hit/miss counters of the parse and rewrite caches."""
+    return {
+        "parse": parse_url.cache_info()._asdict(),
+        "rewrite": _rewrite.cache_info()._asdict(),
+        "canonical": canonical_url.cache_info()._asdict(),
+    }
+
+
+def clear_url_caches():
+    """Empties the parse and rewrite caches."""
+    parse_url.cache_clear()
+    _rewrite.cache_clear()
+    canonical_url.cache_clear()
@@ -17,305 +17,194 @@ import random
 import json
 import glob
 import re
-from flask import Flask, render_template_string, request, send_file, render_template, make_response, redirect, url_for, jsonify
+import gzip
+import threading
+from flask import Flask, Blueprint, current_app, request, render_template, make_response, redirect, url_for, jsonify, Response, stream_with_context, g
 
-from src.csv_parser import csv_to_newsletter_dict
-from src.renderer import render_newsletter
+from src.csv_parser import csv_bytes_to_newsletter_dict, get_parse_cache_stats
+from src.renderer import render_newsletter, apply_responsive_images
 from src.scraper import get_atrapalo_data
-from src.marketing import TrackingGenerator, ImageResizer
+from src.marketing import TrackingGenerator, ImageResizer, iter_url_column, iter_tracking_csv
+from src.urls import canonical_url
+from src.preview_store import PreviewStore
+from src.share_store import ShareStore
+from src.draft_index import DraftIndex
+from src.product_catalog import ProductCatalog, draft_items, snapshot_items
+from src.config import BASE_DIR, load_config, data_folders
+from src.drafts import CSV_HEADER_ROWS, iter_draft_csv, iter_drafts_zip, draft_to_newsletter_dict
+from src.optimizer import clean_editor_html, remove_editor_style
+from src.http_cache import cached_response, send_cached_file, variant_etag
+from werkzeug.utils import safe_join
+from src.audit import audit_images, check_links, IMAGE_BUDGET_BYTES
+from src.instrumentation import render_trace, span, byte_size, get_render_stats
+from src.urls import url_cache_stats
+from src import metrics
 import uuid
+import logging
 
 
 # ============================================================
 #   CONFIGURATION & INITIALIZATION
 # ============================================================
 
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-UPLOADS_DIR = os.path.join(BASE_DIR, "uploads")
-DRAFTS_DIR = os.path.join(BASE_DIR, "drafts")
-PREVIEWS_DIR = os.path.join(BASE_DIR, "previews")
-VISUAL_ARCHIVES_DIR = os.path.join(BASE_DIR, "visual_archives")
+EDITOR_SESSION_COOKIE = "nws_editor"
 
-os.makedirs(UPLOADS_DIR, exist_ok=True)
-os.makedirs(DRAFTS_DIR, exist_ok=True)
-os.makedirs(PREVIEWS_DIR, exist_ok=True)
-os.makedirs(VISUAL_ARCHIVES_DIR, exist_ok=True)
+bp = Blueprint("webapp", __name__)
 
-app = Flask(__name__, template_folder=os.path.join(BASE_DIR, "templates"))
-app.config["UPLOAD_FOLDER"] = UPLOADS_DIR
-app.config["DRAFTS_FOLDER"] = DRAFTS_DIR
+
+def create_app(config: dict | None = None) -> Flask:
+    """
+    App factory: builds a configured app (see config.load_config for the settings).
+    Creates the data directories and the stores shared by the routes:
+    - preview_store: editor previews, one per editor session (cookie), written through
+      to disk so every worker process sees them (PREVIEW_SHARED), cached in memory.
+    - share_store: shareable preview links, content-addressed in PREVIEWS_FOLDER.
+    - draft_index: product URL -> drafts reverse index (DRAFT_INDEX_FILE).
+    - product_catalog: cache of scraped products reused by new drafts (PRODUCT_CATALOG_FILE).
+    Request timing hooks feed the /metrics endpoint (see metrics.py).
+    """
+    config = load_config(config)
+    for folder in data_folders(config):
+        os.makedirs(folder, exist_ok=True)
+
+    app = Flask(__name__, template_folder=os.path.join(BASE_DIR, "templates"))
+    app.config.update(config)
+
+    app.extensions["preview_store"] = PreviewStore(
+        max_memory_bytes=config["PREVIEW_MEMORY_BYTES"],
+        max_entries=config["PREVIEW_MAX_SESSIONS"],
+        ttl=config["PREVIEW_TTL"],
+        spill_dir=os.path.join(config["UPLOAD_FOLDER"], "preview_store"),
+        shared=config["PREVIEW_SHARED"],
+    )
+    app.extensions["share_store"] = ShareStore(
+        config["PREVIEWS_FOLDER"],
+        ttl=config["SHARE_TTL"],
+        max_bytes=config["SHARE_MAX_BYTES"],
+    )
+
+    app.extensions["draft_index"] = DraftIndex(config["DRAFTS_FOLDER"], config["DRAFT_INDEX_FILE"])
+    app.extensions["product_catalog"] = ProductCatalog(config["PRODUCT_CATALOG_FILE"])
+
+    metrics.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+
+def get_preview_store() -> PreviewStore:
+    return current_app.extensions["preview_store"]
+
+
+def get_share_store() -> ShareStore:
+    return current_app.extensions["share_store"]
+
+
+def get_draft_index() -> DraftIndex:
+    return current_app.extensions["draft_index"]
+
+
+def get_product_catalog() -> ProductCatalog:
+    return current_app.extensions["product_catalog"]
+
+
+def _write_atomic(path, text):
+    """
+    Writes a text file through a temporary file and an atomic rename, so concurrent
+    workers never read a half-written draft or archive.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_draft(filepath):
+    """
+    Loads a draft, with its items as used by the review page, render and export.
+    Raises ValueError if the file is not a draft (JSON object, item objects).
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        content = json.load(f)
+    items = content.get("items", []) if isinstance(content, dict) else None
+    if (not isinstance(items, list) or not all(isinstance(item, dict) for item in items)
+            or not isinstance(content.get("config", {}), dict) or not isinstance(content.get("meta", {}), dict)):
+        raise ValueError(f"Borrador con formato no válido: {os.path.basename(filepath)}")
+    content["items"] = draft_items(content.get("items", []))
+    return content
+
+
+def _write_draft(filename, content):
+    """
+    Saves a draft with a full snapshot of each item and its product key ("ref"),
+    so it does not depend on the product catalog. Updates the URL index.
+    """
+    items = content.get("items", [])
+    stored = dict(content, items=snapshot_items(items))
+    _write_atomic(os.path.join(current_app.config["DRAFTS_FOLDER"], filename),
+                  json.dumps(stored, indent=4, ensure_ascii=False))
+    get_draft_index().update(filename, items)
+
+
+def _editor_session_id():
+    """
+    Returns the editor session id from its cookie, creating a new one if missing
+    or malformed (the cookie is then set by _set_editor_session_cookie).
+    """
+    sid = request.cookies.get(EDITOR_SESSION_COOKIE, "")
+    if not re.fullmatch(r"[0-9a-f]{32}", sid):
+        sid = getattr(g, "new_editor_session", None) or uuid.uuid4().hex
+        g.new_editor_session = sid
+    return sid
+
+
+@bp.after_request
+def _set_editor_session_cookie(response):
+    """Persists a newly created editor session id."""
+    sid = g.get("new_editor_session")
+    if sid:
+        response.set_cookie(EDITOR_SESSION_COOKIE, sid, max_age=int(get_preview_store().ttl), httponly=True, samesite="Lax")
+    return response
 
 
 # ============================================================
 #   SECTION 1: DASHBOARD
 # ============================================================
 
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def index():
     """Renders the main control panel for all automation tools."""
-    html = """
-    <!doctype html>
-    <html lang="es">
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Panel de Automatización</title>
-        <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;500;600;700&display=swap" rel="stylesheet">
-        <style>
-            :root { 
-                --primary: #FF002D; 
-                --primary-dark: #D60026;
-                --text-main: #1F2937;
-                --text-sec: #6B7280;
-                --bg: #F3F4F6; 
-                --border: #E5E7EB;
-            }
-            body { 
-                font-family: 'Poppins', sans-serif; 
-                background: var(--bg); 
-                margin: 0; 
-                color: var(--text-main); 
-                display: flex; 
-                justify-content: center; 
-                padding-top: 60px;
-                min-height: 100vh;
-            }
-            
-            .container {
-                max-width: 960px;
-                width: 100%;
-                padding: 0 20px;
-            }
-
-            header {
-                margin-bottom: 30px;
-                border-bottom: 1px solid #E5E7EB;
-                padding-bottom: 20px;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-            }
-            
-            .header-info { flex: 1; }
-
-            h1 { 
-                font-weight: 600; 
-                font-size: 1.5rem; 
-                margin: 0 0 5px 0; 
-                color: #111;
-            }
-            
-            .subtitle {
-                color: var(--text-sec);
-                font-size: 0.95rem;
-                margin: 0;
-            }
-
-            .grid {
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 24px;
-            }
-
-            .card {
-                background: white;
-                border: 1px solid var(--border);
-                border-radius: 8px;
-                padding: 32px;
-                display: flex;
-                flex-direction: column;
-            }
-
-            .card-title {
-                font-size: 1.1rem;
-                font-weight: 600;
-                margin-bottom: 12px;
-                color: #111;
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }
-            
-            .badge-new {
-                background: #EFF6FF;
-                color: #2563EB;
-                font-size: 0.7rem;
-                padding: 2px 8px;
-                border-radius: 4px;
-                font-weight: 600;
-                text-transform: uppercase;
-            }
-
-            .card-desc {
-                font-size: 0.9rem;
-                color: var(--text-sec);
-                margin-bottom: 24px;
-                line-height: 1.6;
-                flex-grow: 1;
-            }
-
-            /* FORM ELEMENTS */
-            label {
-                display: block;
-                font-size: 0.8rem;
-                font-weight: 500;
-                margin-bottom: 6px;
-                color: #374151;
-            }
-
-            input[type="text"], input[type="file"], select {
-                width: 100%;
-                padding: 10px 12px;
-                margin-bottom: 16px;
-                border: 1px solid #D1D5DB;
-                border-radius: 6px;
-                font-size: 0.9rem;
-                font-family: inherit;
-                box-sizing: border-box;
-                background: #F9FAFB;
-            }
-            
-            input:focus, select:focus {
-                outline: none;
-                border-color: var(--primary);
-                background: white;
-            }
-
-            /* BOTONES */
-            .btn {
-                display: inline-flex;
-                justify-content: center;
-                align-items: center;
-                width: 100%;
-                padding: 12px 20px;
-                background: var(--primary);
-                color: white;
-                font-size: 0.95rem;
-                font-weight: 500;
-                border-radius: 6px;
-                border: none;
-                text-decoration: none;
-                cursor: pointer;
-                transition: background 0.2s;
-                box-sizing: border-box;
-            }
-            
-            .btn:hover {
-                background: var(--primary-dark);
-            }
-            
-            .btn-outline {
-                background: white;
-                border: 1px solid var(--primary);
-                color: var(--primary);
-            }
-            
-            .btn-outline:hover {
-                background: #FFF5F5;
-            }
-
-            .btn-small {
-                width: fit-content !important;
-                padding: 12px 20px !important;
-                font-size: 0.9rem !important;
-                height: auto !important;
-                margin-left: auto;
-            }
-
-            @media (max-width: 768px) {
-                .grid { grid-template-columns: 1fr; }
-            }
-        </style>
-    </head>
-    <body>
-
-        <div class="container">
-            <header>
-                <div class="header-info">
-                    <h1>Panel de Control</h1>
-                    <p class="subtitle">Sistema de gestión y automatización de newsletters</p>
-                </div>
-                <a href="/marketing" class="btn btn-outline btn-small">Marketing Tools</a>
-            </header>
-
-            <div class="grid">
-                
-                <div class="card">
-                    <div class="card-title">
-                        Generador de NWS por URL
-                    </div>
-                    <div class="card-desc">
-                        Herramienta para gestionar y automatizar la creación de newsletters a partir de URLs de Atrápalo.
-                        <ul style="padding-left: 20px; margin-top: 10px; margin-bottom: 0;">
-                            <li>Importación automática desde URLs.</li>
-                            <li>Gestión de borradores y estados.</li>
-                            <li>Actualización de precios en tiempo real.</li>
-                        </ul>
-                    </div>
-                    <a href="/scraper" class="btn">Acceder al Gestor</a>
-                </div>
-
-                <div class="card">
-                    <div class="card-title">Generador de NWS por CSV</div>
-                    <div class="card-desc">
-                        Utilidad para procesar un archivo CSV previamente formateado y obtener el código HTML final.
-                    </div>
-                    
-                    <form action="/generate" method="POST" enctype="multipart/form-data">
-                        
-                        <label>Archivo CSV</label>
-                        <input type="file" name="csv_file" required accept=".csv">
-
-                        <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px;">
-                            <div>
-                                <label>Diseño</label>
-                                <select name="card_mode">
-                                    <option value="urbano">Ocio Urbano</option>
-                                    <option value="vacacional">Vacacional</option>
-                                </select>
-                            </div>
-                            <div>
-                                <label>Campaña (UTM)</label>
-                                <input type="text" name="newsletter_title" placeholder="Ej: Promo_Enero">
-                            </div>
-                        </div>
-
-                        <button type="submit" class="btn btn-outline">Generar HTML</button>
-                    </form>
-                    <div style="text-align: right; margin-top: 10px;">
-                        <a href="/visual_archive" style="font-size: 0.85rem; color: #6B7280; text-decoration: none;">Ver Archivo de Newsletters →</a>
-                    </div>
-                </div>
-            </div>
-
-        </div>
-
-    </body>
-    </html>
-    """
-    return render_template_string(html)
+    return render_template("dashboard.html")
 
 
 # ============================================================
 #   SECTION 2: VISUAL EDITOR & NEWSLETTER GENERATION
 # ============================================================
 
-@app.route("/generate", methods=["POST"])
+@bp.route("/generate", methods=["POST"])
 def generate_newsletter():
     """
     Handles CSV upload and initializes the visual editor.
-    1. Saves the uploaded CSV.
+    1. Reads the uploaded CSV.
     2. Parses and prepares data.
-    3. Renders initial HTML and serves the visual editor.
+    3. Renders initial HTML into the session preview and serves the visual editor.
     """
     uploaded_file = request.files["csv_file"]
     card_mode = request.form.get("card_mode", "urbano")
     newsletter_title = request.form.get("newsletter_title", "").strip()
+    responsive_images = request.form.get("responsive_images") == "1"
+
+    csv_bytes = uploaded_file.read()
+
+    with render_trace("generate", card_mode=card_mode):
+        # Identical re-uploads are served from the parse cache
+        newsletter_data = csv_bytes_to_newsletter_dict(csv_bytes)
+        sid = _render_to_preview(newsletter_data, card_mode, newsletter_title, responsive_images)
+
+    return _render_visual_editor(sid)
 
-    csv_path = os.path.join(app.config["UPLOAD_FOLDER"], "input.csv")
-    uploaded_file.save(csv_path)
 
-    newsletter_data = csv_to_newsletter_dict(csv_path)
+def _render_to_preview(newsletter_data, card_mode, newsletter_title, responsive_images=False):
+    """Renders a newsletter dict into the editor session's preview and returns the session id."""
     newsletter_data["card_mode"] = card_mode
     newsletter_data["title"] = newsletter_title
 
@@ -326,17 +215,112 @@ def generate_newsletter():
             break
     newsletter_data["conditions"] = conditions_text
 
-    html_raw = render_newsletter(newsletter_data)
-    html_output = html_raw 
+    html_output = render_newsletter(newsletter_data)
+    if responsive_images:
+        html_output = apply_responsive_images(html_output)
+
+    sid = _editor_session_id()
+    with span("preview_write", input_size=byte_size(html_output)) as record:
+        get_preview_store().put(sid, html_output)
+        record["output_bytes"] = byte_size(html_output)
+    return sid
+
+
+@bp.route("/api/render_stats", methods=["GET"])
+def api_render_stats():
+    """API Endpoint: Per-stage timings aggregated over the most recent renders."""
+    stats = get_render_stats()
+    stats["parse_cache"] = get_parse_cache_stats()
+    stats["preview_store"] = get_preview_store().stats()
+    stats["share_store"] = get_share_store().stats()
+    return jsonify(stats)
+
+
+def _cache_metrics():
+    """Collector for /metrics: hit/miss counters of the parse and URL caches."""
+    caches = {"csv_parse": get_parse_cache_stats()}
+    caches.update({f"url_{name}": stats for name, stats in url_cache_stats().items()})
+    return [
+        ("nws_cache_hits_total", "counter", "Cache hits by cache.",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("nws_cache_misses_total", "counter", "Cache misses by cache.",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+    ]
+
+
+def _store_metrics():
+    """Collector for /metrics: editor preview store of this process."""
+    stats = get_preview_store().stats()
+    return [
+        ("nws_preview_sessions", "gauge", "Editor sessions with a preview.", [({}, stats["sessions"])]),
+        ("nws_preview_memory_bytes", "gauge", "Preview HTML held in memory.", [({}, stats["memory_bytes"])]),
+        ("nws_preview_spills_total", "counter", "Previews spilled to disk.", [({}, stats["spills"])]),
+    ]
+
+
+@bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    text = metrics.render_latest([_cache_metrics, _store_metrics])
+    return Response(text, content_type=metrics.CONTENT_TYPE)
+
+
+def _audit_source_html():
+    """
+    HTML to audit: the posted 'html', an archived newsletter ('archive' filename)
+    or, by default, the current editor preview. Returns None if not found.
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get("html"):
+        return data["html"]
+
+    archive = data.get("archive") or request.args.get("archive")
+    if archive:
+        path = os.path.join(current_app.config["VISUAL_ARCHIVES_FOLDER"], os.path.basename(archive))
+    else:
+        return get_preview_store().get(_editor_session_id())
+
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
 
-    preview_path = os.path.join(app.config["UPLOAD_FOLDER"], "preview.html")
-    with open(preview_path, "w", encoding="utf-8") as f:
-        f.write(html_output)
 
-    return _render_visual_editor(html_output)
+@bp.route("/api/audit/images", methods=["GET", "POST"])
+def api_audit_images():
+    """
+    API Endpoint: Image audit (bytes, format, dimensions, broken/heavy images) of a
+    newsletter. See _audit_source_html for the accepted inputs; ?budget= sets the
+    per-image byte budget.
+    """
+    html = _audit_source_html()
+    if html is None:
+        return jsonify({"error": "Newsletter no encontrada"}), 404
 
+    budget = request.args.get("budget", type=int) or IMAGE_BUDGET_BYTES
+    with span("image_audit", input_size=byte_size(html)) as record:
+        report = audit_images(html, budget_bytes=budget)
+        record["images"] = report["count"]
+    return jsonify(report)
 
-@app.route("/archive_visual", methods=["POST"])
+
+@bp.route("/api/audit/links", methods=["GET", "POST"])
+def api_audit_links():
+    """
+    API Endpoint: Link check of a newsletter (same inputs as /api/audit/images).
+    Returns the status of every distinct link and the broken ones with their block.
+    """
+    html = _audit_source_html()
+    if html is None:
+        return jsonify({"error": "Newsletter no encontrada"}), 404
+
+    with span("link_check", input_size=byte_size(html)) as record:
+        report = check_links(html)
+        record["links"] = report["count"]
+    return jsonify(report)
+
+
+@bp.route("/archive_visual", methods=["POST"])
 def archive_visual():
     """Saves the current state of the visual editor to the persistent archive."""
     data = request.get_json()
@@ -348,20 +332,19 @@ def archive_visual():
         return jsonify({"error": "Nombre vacío"}), 400
         
     filename = f"{name}.html"
-    filepath = os.path.join(VISUAL_ARCHIVES_DIR, filename)
+    filepath = os.path.join(current_app.config["VISUAL_ARCHIVES_FOLDER"], filename)
     
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(data["html"])
+    _write_atomic(filepath, remove_editor_style(data["html"]))
         
     return jsonify({"success": True})
 
 
-@app.route("/visual_archive", methods=["GET"])
+@bp.route("/visual_archive", methods=["GET"])
 def visual_archive_list():
     """Lists all successfully archived newsletters from the visual editor."""
     items = []
-    if os.path.exists(VISUAL_ARCHIVES_DIR):
-        files = glob.glob(os.path.join(VISUAL_ARCHIVES_DIR, "*.html"))
+    if os.path.exists(current_app.config["VISUAL_ARCHIVES_FOLDER"]):
+        files = glob.glob(os.path.join(current_app.config["VISUAL_ARCHIVES_FOLDER"], "*.html"))
         files.sort(key=os.path.getmtime, reverse=True)
         for f in files:
             filename = os.path.basename(f)
@@ -375,346 +358,137 @@ def visual_archive_list():
     return render_template("visual_archive.html", items=items)
 
 
-@app.route("/load_visual_archive/<filename>")
+@bp.route("/load_visual_archive/<filename>")
 def load_visual_archive(filename):
     """Loads a previously archived newsletter back into the visual editor."""
-    filepath = os.path.join(VISUAL_ARCHIVES_DIR, filename)
+    filepath = os.path.join(current_app.config["VISUAL_ARCHIVES_FOLDER"], filename)
     if not os.path.exists(filepath):
         return "Archivo no encontrado", 404
         
     with open(filepath, "r", encoding="utf-8") as f:
         html_content = f.read()
         
-    preview_path = os.path.join(app.config["UPLOAD_FOLDER"], "preview.html")
-    with open(preview_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
+    get_preview_store().put(_editor_session_id(), html_content)
         
-    return redirect(url_for('generate_editor_from_preview'))
+    return redirect(url_for('.generate_editor_from_preview'))
 
-@app.route("/editor_from_preview")
+@bp.route("/editor_from_preview")
 def generate_editor_from_preview():
-    """Auxiliary route to load the visual editor from the current preview file."""
-    preview_path = os.path.join(app.config["UPLOAD_FOLDER"], "preview.html")
-    if not os.path.exists(preview_path):
-        return redirect(url_for('index'))
-        
-    with open(preview_path, "r", encoding="utf-8") as f:
-        html_output = f.read()
+    """Auxiliary route to load the visual editor from the session's current preview."""
+    sid = _editor_session_id()
+    if sid not in get_preview_store():
+        return redirect(url_for('.index'))
         
-    return _render_visual_editor(html_output)
+    return _render_visual_editor(sid)
+
+
+@bp.route("/preview/<sid>")
+def editor_preview(sid):
+    """Serves an editor session's preview (the visual editor iframe)."""
+    html = get_preview_store().get(sid) if re.fullmatch(r"[0-9a-f]{32}", sid) else None
+    if html is None:
+        return "Vista previa no encontrada o caducada", 404
+
+    # Revalidated on every load: an unchanged preview is answered with 304
+    return cached_response(html, cache_control="private, no-cache")
 
-def _render_visual_editor(html_output):
+
+@bp.route("/export_clean", methods=["POST"])
+def export_clean():
     """
-    Renders the Visual Editor UI.
-    Contains the editor interface (preview iframe & code textarea) and 
-    the JavaScript logic for real-time editing, row alignment, and archival.
+    API Endpoint: Returns the editor iframe HTML (raw text/html body or JSON 'html')
+    without the editor attributes and styles, ready to copy into the ESP.
     """
-    result_html = f"""
-    <!doctype html>
-    <html lang="es">
-    <head>
-        <meta charset="utf-8">
-        <title>Editor Visual</title>
-        <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;600&display=swap" rel="stylesheet">
-        <style>
-            body {{ font-family: 'Poppins', sans-serif; padding: 20px; background: #F3F4F6; color: #1F2937; margin: 0; }}
-            .layout {{ display: grid; grid-template-columns: 1fr 1fr; gap: 20px; height: calc(100vh - 120px); }}
-            .panel {{ background: white; padding: 20px; border-radius: 8px; border: 1px solid #E5E7EB; display: flex; flex-direction: column; }}
-            h2 {{ margin-top: 0; font-size: 1.1rem; margin-bottom: 15px; display: flex; align-items: center; justify-content: space-between; }}
-            textarea {{ width: 100%; flex-grow: 1; padding: 15px; font-family: monospace; border: 1px solid #D1D5DB; border-radius: 6px; box-sizing: border-box; background: #F9FAFB; resize: none; font-size: 12px; }}
-            textarea:focus {{ outline: none; border-color: #FF002D; }}
-            iframe {{ width: 100%; flex-grow: 1; border: 1px solid #D1D5DB; border-radius: 6px; background: white; }}
-            .actions {{ margin-bottom: 15px; display: flex; gap: 10px; align-items: center; }}
-            .btn {{ padding: 8px 16px; background: #FF002D; color: white; border: none; border-radius: 6px; font-weight: 500; cursor: pointer; text-decoration: none; font-size: 0.9rem; }}
-            .btn:hover {{ background: #D60026; }}
-            .btn-sec {{ background: white; border: 1px solid #D1D5DB; color: #374151; }}
-            .btn-sec:hover {{ background: #F3F4F6; }}
-            .tip {{ font-size: 0.8rem; color: #6B7280; font-weight: 400; }}
-        </style>
-    </head>
-    <body>
-        <div style="max-width: 1400px; margin: 0 auto;">
-            <div class="actions">
-                <a href="/" class="btn btn-sec" style="background: #fee2e2; color: #991b1b; border-color: #fecaca;">← Cerrar sin guardar</a>
-                <h1 style="font-size: 1.3rem; margin: 0; margin-left: 20px; margin-right: auto;">Editor Visual</h1>
-                
-                <div style="display: flex; gap: 10px;">
-                    <a href="/visual_archive" class="btn btn-sec">Ver Archivo</a>
-                    <button class="btn btn-sec" onclick="share()">Generar Enlace</button>
-                    <button class="btn" style="background: #dcfce7; color: #166534; border: 1px solid #bbf7d0;" onclick="saveToArchive()">Guardar y Salir</button>
-                </div>
-            </div>
-            
-            <div class="layout">
-                <div class="panel">
-                    <h2>
-                        Previsualización
-                        <span class="tip">Haz clic en los textos para editarlos</span>
-                    </h2>
-                    <iframe id="preview-frame" src="/uploads/preview.html"></iframe>
-                </div>
-                
-                <div class="panel">
-                    <h2>
-                        Código HTML
-                        <button class="btn btn-sec" style="padding: 4px 12px; font-size: 0.8rem;" onclick="copy()">Copiar Código</button>
-                    </h2>
-                    <textarea id="code" readonly>{html_output.replace("<", "&lt;")}</textarea>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            const frame = document.getElementById('preview-frame');
-            const codeArea = document.getElementById('code');
-
-            function copy() {{
-                codeArea.select();
-                document.execCommand("copy");
-                const btn = event.target;
-                const originalText = btn.innerText;
-                btn.innerText = "¡Copiado!";
-                setTimeout(() => btn.innerText = originalText, 2000);
-            }}
-
-            async function share() {{
-                const btn = event.target;
-                const originalText = btn.innerText;
-                btn.innerText = "Generando...";
-                btn.disabled = true;
-
-                try {{
-                    const doc = frame.contentDocument || frame.contentWindow.document;
-                    const clone = doc.documentElement.cloneNode(true);
-                    const injectedStyle = clone.querySelector('#editor-style');
-                    if (injectedStyle) injectedStyle.remove();
-
-                    clone.querySelectorAll('[contenteditable], [data-editable-spacer], [data-card-container], [data-container-type], [data-base-height], [data-card-row], [data-spacer-id], [data-card-main], [data-floor]').forEach(el => {{
-                        el.removeAttribute('contenteditable');
-                        el.removeAttribute('data-editable-spacer');
-                        el.removeAttribute('data-card-container');
-                        el.removeAttribute('data-container-type');
-                        el.removeAttribute('data-base-height');
-                        el.removeAttribute('data-card-row');
-                        el.removeAttribute('data-spacer-id');
-                        el.removeAttribute('data-card-main');
-                        el.removeAttribute('data-floor');
-                        if (el.style.outline) el.style.outline = "";
-                        if (el.style.cursor) el.style.cursor = "";
-                        if (el.style.minHeight) el.style.minHeight = "";
-                        if (el.getAttribute('style') === "") el.removeAttribute('style');
-                    }});
-
-                    const finalHtml = "<!DOCTYPE html>\\n" + clone.outerHTML;
-
-                    const response = await fetch('/share_preview', {{
-                        method: 'POST',
-                        headers: {{ 'Content-Type': 'application/json' }},
-                        body: JSON.stringify({{ html: finalHtml }})
-                    }});
-
-                    const result = await response.json();
-                    if (result.url) {{
-                        prompt("Enlace de vista previa generado:", result.url);
-                    }} else {{
-                        alert("Error al generar el enlace");
-                    }}
-                }} catch (err) {{
-                    console.error(err);
-                    alert("Error de conexión");
-                }} finally {{
-                    btn.innerText = originalText;
-                    btn.disabled = false;
-                }}
-            }}
-
-            async function saveToArchive() {{
-                const btn = event.target;
-                const originalText = btn.innerText;
-                btn.innerText = "Guardando...";
-                btn.disabled = true;
-
-                try {{
-                    const doc = frame.contentDocument || frame.contentWindow.document;
-                    
-                    let name = doc.title || "Newsletter_Sin_Nombre";
-                    name = name.trim().replace(/[/\\\\?%*:|"<>]/g, '-');
-                    if (!name) name = "Newsletter_Borrador";
+    data = request.get_json(silent=True)
+    html = data.get("html", "") if isinstance(data, dict) else request.get_data(as_text=True)
+    with span("export_clean", input_size=byte_size(html)) as record:
+        clean = clean_editor_html(html)
+        record["output_bytes"] = byte_size(clean)
+    return Response(clean, mimetype="text/html")
 
-                    const clone = doc.documentElement.cloneNode(true);
-                    const injectedStyle = clone.querySelector('#editor-style');
-                    if (injectedStyle) injectedStyle.remove();
-                    
-                    const finalHtml = "<!DOCTYPE html>\\n" + clone.outerHTML;
-
-                    const response = await fetch('/archive_visual', {{
-                        method: 'POST',
-                        headers: {{ 'Content-Type': 'application/json' }},
-                        body: JSON.stringify({{ name: name, html: finalHtml }})
-                    }});
-
-                    const result = await response.json();
-                    if (result.success) {{
-                        alert("Guardado correctamente. Volviendo al panel...");
-                        window.location.href = '/';
-                    }} else {{
-                        alert("Error: " + result.error);
-                        btn.innerText = originalText;
-                        btn.disabled = false;
-                    }}
-                }} catch (err) {{
-                    console.error(err);
-                    alert("Error de conexión");
-                    btn.innerText = originalText;
-                    btn.disabled = false;
-                }}
-            }}
-
-            frame.onload = function() {{
-                const doc = frame.contentDocument || frame.contentWindow.document;
-                const style = doc.createElement('style');
-                style.id = "editor-style";
-                style.textContent = `
-                    [contenteditable]:hover {{ outline: 1px dashed #ccc; cursor: text; }}
-                    [contenteditable]:focus {{ outline: 2px solid #ff002d; background: rgba(255,0,45,0.05); }}
-                    [data-editable-spacer] {{ position: relative; }}
-                    [data-editable-spacer]:hover {{ outline: 1px solid red; cursor: ns-resize; background: rgba(255,0,0,0.1); }}
-                `;
-                doc.head.appendChild(style);
-
-                function realignRow(rowEl) {{
-                    if (!rowEl) return;
-                    ['top', 'bottom'].forEach(type => {{
-                        const containers = Array.from(rowEl.querySelectorAll(`[data-container-type="${{type}}"]`));
-                        if (containers.length < 2) return;
-                        containers.forEach(c => {{
-                            c.style.height = "auto";
-                            const floor = c.getAttribute('data-floor');
-                            if (floor) {{ c.style.minHeight = floor + "px"; }}
-                            if (type === 'top') {{
-                                const filler = c.querySelector('[data-spacer-id="post-rating"]');
-                                if (filler) {{
-                                    const b = (filler.getAttribute('data-base-height') || 20) + "px";
-                                    filler.style.height = b;
-                                    filler.style.lineHeight = b;
-                                }}
-                            }}
-                        }});
-                        void rowEl.offsetHeight;
-                        let maxH = 0;
-                        containers.forEach(c => {{
-                            const h = c.getBoundingClientRect().height;
-                            if (h > maxH) maxH = h;
-                        }});
-                        containers.forEach(c => {{
-                            const h = c.getBoundingClientRect().height;
-                            const diff = maxH - h;
-                            if (diff > 0.5 && type === 'top') {{
-                                const filler = c.querySelector('[data-spacer-id="post-rating"]');
-                                if (filler) {{
-                                    const current = parseFloat(filler.style.height) || filler.offsetHeight || 0;
-                                    filler.style.height = (current + diff) + "px";
-                                    filler.style.lineHeight = (current + diff) + "px";
-                                }}
-                            }}
-                            c.style.height = maxH + "px";
-                        }});
-                    }});
-                }}
-
-                function sync() {{
-                    const clone = doc.documentElement.cloneNode(true);
-                    const injectedStyle = clone.querySelector('#editor-style');
-                    if (injectedStyle) injectedStyle.remove();
-                    clone.querySelectorAll('[contenteditable], [data-editable-spacer], [data-card-container], [data-container-type], [data-base-height], [data-card-row], [data-spacer-id], [data-card-main], [data-floor]').forEach(el => {{
-                        el.removeAttribute('contenteditable');
-                        el.removeAttribute('data-editable-spacer');
-                        el.removeAttribute('data-card-container');
-                        el.removeAttribute('data-container-type');
-                        el.removeAttribute('data-base-height');
-                        el.removeAttribute('data-card-row');
-                        el.removeAttribute('data-spacer-id');
-                        el.removeAttribute('data-card-main');
-                        el.removeAttribute('data-floor');
-                        if (el.style.outline) el.style.outline = "";
-                        if (el.style.cursor) el.style.cursor = "";
-                        if (el.style.minHeight) el.style.minHeight = "";
-                        if (el.getAttribute('style') === "") el.removeAttribute('style');
-                    }});
-                    codeArea.value = "<!DOCTYPE html>\\n" + clone.outerHTML;
-                }}
-
-                doc.querySelectorAll('p, td, span, strong, h1, h2, h3, a, b, i, font, s, div, h4').forEach(el => {{
-                    if (el.children.length === 0 || (el.tagName === 'A' && el.innerText.trim() !== "")) {{
-                        el.contentEditable = "true";
-                    }}
-                }});
-
-                doc.querySelectorAll('[data-editable-spacer]').forEach(el => {{
-                    el.addEventListener('click', (e) => {{
-                        e.preventDefault();
-                        const oldH = el.offsetHeight;
-                        const inputH = prompt("Ajustar espacio (px):", oldH);
-                        if (inputH !== null && !isNaN(inputH)) {{
-                            const newH = parseInt(inputH);
-                            const row = el.closest('[data-card-row]');
-                            const spacerId = el.getAttribute('data-spacer-id');
-                            if (spacerId === "post-rating" && row) {{
-                                row.querySelectorAll(`[data-spacer-id="post-rating"]`).forEach(s => {{
-                                    s.style.height = newH + "px";
-                                    s.style.lineHeight = newH + "px";
-                                    s.setAttribute('data-base-height', newH);
-                                }});
-                                realignRow(row);
-                            }} else {{
-                                el.style.height = newH + "px";
-                                el.style.lineHeight = newH + "px";
-                                if (el.hasAttribute('data-base-height')) el.setAttribute('data-base-height', newH);
-                            }}
-                            sync();
-                        }}
-                    }});
-                }});
-
-                doc.addEventListener('input', () => {{
-                    doc.querySelectorAll('[data-card-row]').forEach(realignRow);
-                    sync();
-                }});
-
-                setTimeout(() => {{
-                    doc.querySelectorAll('[data-card-row]').forEach(realignRow);
-                    sync();
-                }}, 400);
-            }};
-        </script>
-    </body>
-    </html>
+
+@bp.route("/share_preview", methods=["POST"])
+def share_preview():
+    """
+    API Endpoint: Stores the posted HTML as a shareable preview. The editor sends
+    the /export_clean output; editor attributes left by other callers are stripped.
+    Identical HTML gives the same link (content hash).
+    """
+    data = request.get_json(silent=True) or {}
+    html = data.get("html")
+    if not html:
+        return jsonify({"error": "Falta el HTML de la vista previa"}), 400
+
+    with span("share_preview", input_size=byte_size(html)):
+        digest = get_share_store().put(clean_editor_html(html))
+    return jsonify({"id": digest, "url": url_for(".shared_preview", digest=digest, _external=True)})
+
+
+@bp.route("/share/<digest>")
+def shared_preview(digest):
+    """Serves a shared preview: immutable, gzip-compressed at rest, with a strong ETag per encoding."""
+    data = get_share_store().get_compressed(digest)
+    if data is None:
+        return "Vista previa no encontrada o caducada", 404
+
+    encoding = "gzip" if request.accept_encodings["gzip"] else None
+    etag = variant_etag(digest, encoding)
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    elif encoding:
+        response = make_response(data)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = make_response(gzip.decompress(data))
+
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag)
+    return response
+
+
+def _render_visual_editor(sid):
     """
-    from flask import render_template_string
-    return render_template_string(result_html)
+    Renders the Visual Editor UI (templates/visual_editor.html): the editor interface
+    (preview iframe & code textarea) and the JavaScript logic for real-time editing,
+    row alignment, and archival.
+    The shell does not embed the newsletter: the iframe loads it once from
+    /preview/<sid> and the code panel is filled from the iframe document.
+    """
+    return render_template("visual_editor.html", sid=sid)
+
+
+@bp.route("/visual_archive/<filename>")
+def view_visual_archive(filename):
+    """Serves an archived newsletter as HTML (compressed, with ETag / 304)."""
+    filepath = safe_join(current_app.config["VISUAL_ARCHIVES_FOLDER"], filename)
+    if filepath is None:
+        return "Archivo no encontrado", 404
+    return send_cached_file(filepath, current_app.config["HTTP_CACHE_FOLDER"])
 
 
-@app.route("/delete_visual/<filename>")
+@bp.route("/delete_visual/<filename>")
 def delete_visual(filename):
     """Deletes a newsletter from the visual editor archive."""
-    filepath = os.path.join(VISUAL_ARCHIVES_DIR, filename)
+    filepath = os.path.join(current_app.config["VISUAL_ARCHIVES_FOLDER"], filename)
     if os.path.exists(filepath):
         os.remove(filepath)
-    return redirect(url_for('visual_archive_list'))
+    return redirect(url_for('.visual_archive_list'))
 
 
 # ============================================================
 #   SECTION 3: SCRAPER SYSTEM & KANBAN
 # ============================================================
 
-@app.route("/scraper", methods=["GET"])
+@bp.route("/scraper", methods=["GET"])
 def scraper_index():
     """Renders the scraper dashboard with Pending and Ready drafts."""
     drafts_pending = []
     drafts_ready = []
     
-    if os.path.exists(DRAFTS_DIR):
-        files = glob.glob(os.path.join(DRAFTS_DIR, "*.json"))
+    if os.path.exists(current_app.config["DRAFTS_FOLDER"]):
+        files = glob.glob(os.path.join(current_app.config["DRAFTS_FOLDER"], "*.json"))
         files.sort(key=os.path.getmtime, reverse=True)
         for f in files:
             filename = os.path.basename(f)
@@ -736,13 +510,13 @@ def scraper_index():
                            drafts_pending=drafts_pending, 
                            drafts_ready=drafts_ready)
 
-@app.route("/scraper/archive", methods=["GET"])
+@bp.route("/scraper/archive", methods=["GET"])
 def scraper_archive():
     """Lists all archived scraper drafts."""
     drafts_archived = []
     
-    if os.path.exists(DRAFTS_DIR):
-        files = glob.glob(os.path.join(DRAFTS_DIR, "*.json"))
+    if os.path.exists(current_app.config["DRAFTS_FOLDER"]):
+        files = glob.glob(os.path.join(current_app.config["DRAFTS_FOLDER"], "*.json"))
         files.sort(key=os.path.getmtime, reverse=True)
         for f in files:
             filename = os.path.basename(f)
@@ -762,7 +536,7 @@ def scraper_archive():
     return render_template("scraper_archive.html", drafts_archived=drafts_archived)
 
 
-@app.route("/scraper/review", methods=["POST"])
+@bp.route("/scraper/review", methods=["POST"])
 def scraper_review():
     """
     Initializes a new draft by scraping a list of URLs.
@@ -771,11 +545,24 @@ def scraper_review():
     raw_urls = request.form.get("urls", "").strip()
     url_list = [u.strip() for u in raw_urls.split('\n') if u.strip()]
     
+    catalog = get_product_catalog()
+    max_age = current_app.config["CATALOG_MAX_AGE"]
+
     scraped_items = []
     for i, url in enumerate(url_list):
+        # Products fetched recently are taken from the catalog, without scraping
+        data = catalog.fresh(url, max_age)
+        metrics.inc("nws_catalog_lookups_total", result="hit" if data else "miss")
+        if data:
+            data["url"] = url
+            data.setdefault("separator", "")
+            scraped_items.append(data)
+            continue
+
         print(f"Procesando {i+1}/{len(url_list)}: {url}")
         data = get_atrapalo_data(url)
         if data:
+            catalog.put(url, data)
             scraped_items.append(data)
         else:
             scraped_items.append({
@@ -802,65 +589,30 @@ def scraper_review():
     
     return render_template("scraper_review.html", items=scraped_items, config=default_config)
 
-@app.route("/update_prices", methods=["POST"])
+def _apply_fresh_data(item, fresh_data):
+    """Copies the fields that change over time (prices, discount, rating, tag) from a rescrape."""
+    for key in ("price", "price_old", "discount", "rating"):
+        item[key] = fresh_data.get(key, item.get(key))
+    if fresh_data.get("tag"): item["tag"] = fresh_data.get("tag")
+
+@bp.route("/update_prices", methods=["POST"])
 def update_prices():
     """
     Refreshes prices and ratings for all products in a draft.
     Triggers a re-scrape for each URL to ensure data is up to date.
     """
-    try:
-        total_items = int(request.form.get("total_items", 0))
-    except:
-        total_items = 0
-        
     draft_name = request.form.get("draft_name", "")
     current_status = request.form.get("status_choice", "pending")
-
-    config = {
-        "csv_localizacion": request.form.get("csv_localizacion"),
-        "csv_producto": request.form.get("csv_producto"),
-        "csv_tipo_envio": request.form.get("csv_tipo_envio"),
-        "csv_fenvio": request.form.get("csv_fenvio"),
-        "csv_header": request.form.get("csv_header"),
-        "csv_link_header": request.form.get("csv_link_header"),
-        "csv_asunto": request.form.get("csv_asunto"),
-        "csv_preheader": request.form.get("csv_preheader"),
-        "csv_txt_boton": request.form.get("csv_txt_boton"),
-        "csv_link_footer": request.form.get("csv_link_footer"),
-        "csv_banner": request.form.get("csv_banner"),
-        "csv_link_banner": request.form.get("csv_link_banner"),
-        "csv_condiciones": request.form.get("csv_condiciones")
-    }
+    config, items = _draft_from_form()
 
     updated_items = []
-    for i in range(1, total_items + 1):
-        idx = str(i)
-        url = request.form.get(f"url_{idx}")
-        item = {
-            "order": request.form.get(f"order_{idx}"),
-            "title": request.form.get(f"title_{idx}"),
-            "metadata_1": request.form.get(f"meta1_{idx}"),
-            "metadata_2": request.form.get(f"meta2_{idx}"),
-            "description": request.form.get(f"desc_{idx}"),
-            "image": request.form.get(f"image_{idx}"),
-            "url": url,
-            "tag": request.form.get(f"tag_{idx}"),
-            "separator": request.form.get(f"separator_{idx}"),
-            "cta": request.form.get(f"cta_{idx}"),
-            "price": request.form.get(f"price_{idx}"),
-            "price_old": request.form.get(f"price_old_{idx}"),
-            "discount": request.form.get(f"discount_{idx}"),
-            "rating": request.form.get(f"rating_{idx}")
-        }
-        
+    for item in items:
+        url = item["url"]
         if url and "atrapalo.com" in url:
             fresh_data = get_atrapalo_data(url)
             if fresh_data:
-                item["price"] = fresh_data.get("price", item["price"])
-                item["price_old"] = fresh_data.get("price_old", item["price_old"])
-                item["discount"] = fresh_data.get("discount", item["discount"])
-                item["rating"] = fresh_data.get("rating", item["rating"])
-                if fresh_data.get("tag"): item["tag"] = fresh_data.get("tag")
+                get_product_catalog().put(url, fresh_data)
+                _apply_fresh_data(item, fresh_data)
             time.sleep(random.uniform(1, 2))
             
         updated_items.append(item)
@@ -872,14 +624,9 @@ def update_prices():
                            current_status=current_status,
                            message="Precios actualizados correctamente.")
 
-@app.route("/save_draft", methods=["POST"])
+@bp.route("/save_draft", methods=["POST"])
 def save_draft():
     """Saves the current state of a scraper draft to a JSON file."""
-    try:
-        total_items = int(request.form.get("total_items", 0))
-    except:
-        total_items = 0
-        
     draft_name = request.form.get("draft_name", "").strip()
     if not draft_name:
         draft_name = f"borrador_{int(time.time())}"
@@ -887,42 +634,7 @@ def save_draft():
         draft_name += ".json"
 
     status_value = request.form.get("status_choice", "pending")
-
-    config = {
-        "csv_localizacion": request.form.get("csv_localizacion"),
-        "csv_producto": request.form.get("csv_producto"),
-        "csv_tipo_envio": request.form.get("csv_tipo_envio"),
-        "csv_fenvio": request.form.get("csv_fenvio"),
-        "csv_header": request.form.get("csv_header"),
-        "csv_link_header": request.form.get("csv_link_header"),
-        "csv_asunto": request.form.get("csv_asunto"),
-        "csv_preheader": request.form.get("csv_preheader"),
-        "csv_txt_boton": request.form.get("csv_txt_boton"),
-        "csv_link_footer": request.form.get("csv_link_footer"),
-        "csv_banner": request.form.get("csv_banner"),
-        "csv_link_banner": request.form.get("csv_link_banner"),
-        "csv_condiciones": request.form.get("csv_condiciones")
-    }
-
-    items = []
-    for i in range(1, total_items + 1):
-        idx = str(i)
-        items.append({
-            "order": request.form.get(f"order_{idx}"),
-            "title": request.form.get(f"title_{idx}"),
-            "metadata_1": request.form.get(f"meta1_{idx}"),
-            "metadata_2": request.form.get(f"meta2_{idx}"),
-            "description": request.form.get(f"desc_{idx}"),
-            "image": request.form.get(f"image_{idx}"),
-            "url": request.form.get(f"url_{idx}"),
-            "discount": request.form.get(f"discount_{idx}"),
-            "price_old": request.form.get(f"price_old_{idx}"),
-            "price": request.form.get(f"price_{idx}"),
-            "tag": request.form.get(f"tag_{idx}"),
-            "rating": request.form.get(f"rating_{idx}"),
-            "separator": request.form.get(f"separator_{idx}"),
-            "cta": request.form.get(f"cta_{idx}")
-        })
+    config, items = _draft_from_form()
 
     data_to_save = {
         "meta": {"status": status_value, "updated_at": time.time()},
@@ -930,12 +642,11 @@ def save_draft():
         "items": items
     }
     
-    with open(os.path.join(DRAFTS_DIR, draft_name), "w", encoding="utf-8") as f:
-        json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+    _write_draft(draft_name, data_to_save)
         
-    return redirect(url_for('scraper_index'))
+    return redirect(url_for('.scraper_index'))
 
-@app.route("/api/update_status", methods=["POST"])
+@bp.route("/api/update_status", methods=["POST"])
 def api_update_status():
     """API Endpoint: Updates the status of a draft (Pending/Ready/Archived) for the Kanban board."""
     data = request.json
@@ -945,7 +656,7 @@ def api_update_status():
     if not filename or not new_status:
         return jsonify({"error": "Faltan datos"}), 400
         
-    filepath = os.path.join(DRAFTS_DIR, filename)
+    filepath = os.path.join(current_app.config["DRAFTS_FOLDER"], filename)
     if not os.path.exists(filepath):
         return jsonify({"error": "Archivo no encontrado"}), 404
         
@@ -956,20 +667,19 @@ def api_update_status():
         content["meta"]["status"] = new_status
         content["meta"]["updated_at"] = time.time()
         
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(content, f, indent=4, ensure_ascii=False)
+        _write_atomic(filepath, json.dumps(content, indent=4, ensure_ascii=False))
+        get_draft_index().update(filename, content.get("items", []))
             
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/load_draft/<filename>")
+@bp.route("/load_draft/<filename>")
 def load_draft(filename):
     """Loads a scraper draft into the review page."""
-    filepath = os.path.join(DRAFTS_DIR, filename)
+    filepath = os.path.join(current_app.config["DRAFTS_FOLDER"], filename)
     if os.path.exists(filepath):
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_draft(filepath)
         current_status = data.get("meta", {}).get("status", "pending")
         return render_template("scraper_review.html", 
                                items=data.get("items", []), 
@@ -979,172 +689,288 @@ def load_draft(filename):
     else:
         return "Borrador no encontrado", 404
 
-@app.route("/delete_draft/<filename>")
+@bp.route("/delete_draft/<filename>")
 def delete_draft(filename):
     """Deletes a scraper draft file."""
-    filepath = os.path.join(DRAFTS_DIR, filename)
+    filepath = os.path.join(current_app.config["DRAFTS_FOLDER"], filename)
     if os.path.exists(filepath):
         try: os.remove(filepath)
         except: pass
+        get_draft_index().remove(filename)
     
     referer = request.headers.get("Referer", "")
     if "archive" in referer:
-        return redirect(url_for('scraper_archive'))
-    return redirect(url_for('scraper_index'))
-
-def force_spanish_format(val):
-    """Utility: Formats numbers to use Spanish conventions (dot as thousand separator, comma as decimal)."""
-    if not val: return ""
-    val = str(val).replace("€", "").strip()
-    if "," in val and "." not in val: return val
-    try:
-        f = float(val)
-        usa = "{:,.2f}".format(f)
-        if usa.endswith(".00"): usa = "{:,.0f}".format(f)
-        return usa.replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return val
+        return redirect(url_for('.scraper_archive'))
+    return redirect(url_for('.scraper_index'))
 
-def inject_tracking(url, campaign_name, date_str):
-    """
-    Utility: Injects Atrápalo-specific 'atr_trk' parameters into product URLs.
-    Uses IDs for activities and dates for hotels.
-    """
-    if not url: return ""
-    base_url = url.split("?")[0]
-    
-    # LÓGICA HÍBRIDA:
-    # 1. Si es HOTEL -> Usar fecha (ignorar ID)
-    if "/hoteles/" in base_url or "/hotel/" in base_url:
-        if date_str: identifier = date_str.replace("-", "")
-        else: identifier = time.strftime("%Y%m%d")
-        
-    # 2. Si es OCIO -> Usar ID si existe
-    else:
-        match = re.search(r"_(e|a)(\d+)", base_url)
-        if match:
-            identifier = match.group(2)
-        else:
-            if date_str: identifier = date_str.replace("-", "")
-            else: identifier = time.strftime("%Y%m%d")
-    
-    camp = campaign_name.strip() if campaign_name else "CAMPAÑA"
-    tracking_param = f"atr_trk=N1-{identifier}-{camp}"
-    return f"{base_url}?{tracking_param}"
+@bp.route("/api/drafts/by_url", methods=["GET"])
+def api_drafts_by_url():
+    """API Endpoint: drafts (and item positions, 0-based) that contain a product URL (?url=...)."""
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "Falta la URL"}), 400
+    return jsonify({"url": url, "drafts": get_draft_index().lookup(url)})
 
-@app.route("/scraper/download", methods=["POST"])
-def scraper_download():
+
+@bp.route("/api/drafts/refresh", methods=["POST"])
+def api_refresh_drafts():
     """
-    Generates a CSV download for the current draft.
-    Applies tracking to URLs and formats prices for legacy CSV imports.
+    API Endpoint: rescrapes product URLs once each, updates the product catalog and
+    patches, in place, every saved draft that contains them (prices, discount, rating, tag).
+    Drafts that cannot be read or written are listed in 'drafts_failed' with the error.
+    Body: JSON {"urls": [...]} or form field 'urls' (one per line).
     """
+    payload = request.get_json(silent=True) or {}
+    urls = payload.get("urls") or [u.strip() for u in request.form.get("urls", "").split("\n") if u.strip()]
+    if not urls:
+        return jsonify({"error": "Faltan URLs"}), 400
+
+    targets = get_draft_index().lookup_many(urls)
+    results = []
+    fresh = {}
+    for url in urls:
+        key = canonical_url(url)
+        if key not in targets:
+            results.append({"url": url, "drafts": 0, "updated": False})
+            continue
+        if key in fresh:
+            continue
+        if fresh:
+            time.sleep(random.uniform(1, 2))
+        fresh[key] = get_atrapalo_data(url.split("?")[0].strip())
+        if fresh[key]:
+            get_product_catalog().put(url, fresh[key])
+        results.append({"url": url, "drafts": len(targets[key]), "updated": bool(fresh[key])})
+
+    # One read and one write per draft, whatever the number of URLs it contains
+    patches = {}
+    for key, fresh_data in fresh.items():
+        if fresh_data:
+            for filename in targets[key]:
+                patches.setdefault(filename, []).append((key, fresh_data))
+
+    drafts_updated = []
+    drafts_failed = []
+    items_updated = 0
+    for filename, draft_patches in patches.items():
+        # A draft is written only once all its items are patched; a failure leaves it as it was
+        try:
+            content = _read_draft(os.path.join(current_app.config["DRAFTS_FOLDER"], filename))
+            items = content["items"]
+            patched = 0
+            for key, fresh_data in draft_patches:
+                # Items are matched in the file as it is now (it may have changed since it was indexed)
+                for item in items:
+                    if canonical_url(str(item.get("url") or "")) == key:
+                        _apply_fresh_data(item, fresh_data)
+                        patched += 1
+            if not patched:
+                continue
+            content.setdefault("meta", {})["updated_at"] = time.time()
+            _write_draft(filename, content)
+        except Exception as e:
+            drafts_failed.append({"draft": filename, "error": str(e)})
+            continue
+        drafts_updated.append(filename)
+        items_updated += patched
+
+    return jsonify({"urls": results, "drafts_updated": drafts_updated, "drafts_failed": drafts_failed,
+                    "items_updated": items_updated})
+
+
+def _draft_from_form():
+    """Reads the draft being edited in the review page: (config, items) as stored in drafts/*.json."""
     try:
         total_items = int(request.form.get("total_items", 0))
     except:
         total_items = 0
-    
-    campaign_name = request.form.get("csv_localizacion", "CAMPAÑA")
-    date_str = request.form.get("csv_fenvio", "")
 
-    si = io.StringIO()
-    writer = csv.writer(si, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-    def trk(u): return inject_tracking(u, campaign_name, date_str)
-    
-    c = lambda k: request.form.get(k, "")
-    e = [""] * 12
-    writer.writerow(["LOCALIZACIÓN:", c("csv_localizacion")] + e)
-    writer.writerow(["PRODUCTO:", c("csv_producto")] + e)
-    writer.writerow(["TIPO DE ENVÍO:", c("csv_tipo_envio")] + e)
-    writer.writerow(["FENVIO:", c("csv_fenvio")] + e)
-    writer.writerow(["HEADER:", c("csv_header")] + e)
-    writer.writerow(["LINK HEADER:", trk(c("csv_link_header"))] + e)
-    writer.writerow(["ASUNTO:", c("csv_asunto")] + e)
-    writer.writerow(["PREHEADER:", c("csv_preheader")] + e)
-    writer.writerow(["TXT_BOTON_FOOTER:", c("csv_txt_boton")] + e)
-    writer.writerow(["LINK_FOOTER:", trk(c("csv_link_footer"))] + e)
-    writer.writerow(["BANNER_FOOTER:", c("csv_banner")] + e)
-    writer.writerow(["LINK_BANNER_FOOTER:", trk(c("csv_link_banner"))] + e)
-    writer.writerow(["CONDICIONES_FOOTER:", c("csv_condiciones")] + e)
-    writer.writerow([])
-    writer.writerow([])
-    writer.writerow([])
-
-    writer.writerow(["Orden", "Nombre Oferta", "Metadato 1", "Metadato 2", "Descripción", "URL foto", "URL oferta", "Descuento", "Precio", "Precio ATR", "TAGS", "RATING", "SEPARADOR", "SEPARADOR IMG", "CTA"])
-    
+    config = {key: request.form.get(key) for _, key, _ in CSV_HEADER_ROWS}
+
+    items = []
     for i in range(1, total_items + 1):
         idx = str(i)
-        r_val = request.form.get(f"rating_{idx}", "")
-        r_fin = f"{r_val} - Excelente" if r_val and "-" not in r_val else r_val
-        
-        p_old = force_spanish_format(request.form.get(f"price_old_{idx}", ""))
-        p_atr = force_spanish_format(request.form.get(f"price_{idx}", ""))
-        
-        raw_url = request.form.get(f"url_{idx}")
-        tracked_url = inject_tracking(raw_url, campaign_name, date_str)
-
-        writer.writerow([
-            request.form.get(f"order_{idx}"),
-            request.form.get(f"title_{idx}"),
-            request.form.get(f"meta1_{idx}"),
-            request.form.get(f"meta2_{idx}"),
-            request.form.get(f"desc_{idx}"),
-            request.form.get(f"image_{idx}"),
-            tracked_url,
-            request.form.get(f"discount_{idx}"),
-            p_old,
-            p_atr,
-            request.form.get(f"tag_{idx}", "Sin tag"),
-            r_fin,
-            request.form.get(f"separator_{idx}", ""),
-            "",
-            request.form.get(f"cta_{idx}", "Ver plan")
-        ])
-        
-    output = make_response(si.getvalue())
-    output.data = si.getvalue().encode('utf-8-sig')
-    output.headers["Content-Disposition"] = "attachment; filename=input_scraped.csv"
-    output.headers["Content-type"] = "text/csv; charset=utf-8-sig"
-    return output
+        items.append({
+            "order": request.form.get(f"order_{idx}"),
+            "title": request.form.get(f"title_{idx}"),
+            "metadata_1": request.form.get(f"meta1_{idx}"),
+            "metadata_2": request.form.get(f"meta2_{idx}"),
+            "description": request.form.get(f"desc_{idx}"),
+            "image": request.form.get(f"image_{idx}"),
+            "url": request.form.get(f"url_{idx}"),
+            "discount": request.form.get(f"discount_{idx}"),
+            "price_old": request.form.get(f"price_old_{idx}"),
+            "price": request.form.get(f"price_{idx}"),
+            "tag": request.form.get(f"tag_{idx}"),
+            "rating": request.form.get(f"rating_{idx}"),
+            "separator": request.form.get(f"separator_{idx}"),
+            "cta": request.form.get(f"cta_{idx}")
+        })
+    return config, items
+
+
+def _csv_download(chunks, filename, mimetype):
+    """Streamed file download."""
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+@bp.route("/scraper/download", methods=["POST"])
+def scraper_download():
+    """
+    Streams a CSV download for the current draft.
+    Applies tracking to URLs and formats prices for legacy CSV imports (see drafts.draft_csv_rows).
+    """
+    config, items = _draft_from_form()
+    response = _csv_download(iter_draft_csv(config, items), "input_scraped.csv", "text/csv")
+    response.headers["Content-type"] = "text/csv; charset=utf-8-sig"
+    return response
+
+
+def _render_draft(config, items):
+    """Renders a draft straight into the visual editor (no CSV export/parse round trip)."""
+    card_mode = request.values.get("card_mode", "urbano")
+    newsletter_title = (request.values.get("newsletter_title") or "").strip()
+    responsive_images = request.values.get("responsive_images") == "1"
+
+    with render_trace("render_draft", card_mode=card_mode):
+        newsletter_data = draft_to_newsletter_dict(config, items)
+        sid = _render_to_preview(newsletter_data, card_mode, newsletter_title, responsive_images)
+
+    return _render_visual_editor(sid)
+
+
+@bp.route("/scraper/render", methods=["POST"])
+def scraper_render():
+    """Generates the newsletter of the draft being edited in the review page."""
+    config, items = _draft_from_form()
+    return _render_draft(config, items)
+
+
+@bp.route("/render_draft/<filename>")
+def render_draft(filename):
+    """Generates the newsletter of a saved draft (?card_mode=vacacional&newsletter_title=...)."""
+    filepath = safe_join(current_app.config["DRAFTS_FOLDER"], filename)
+    if not filepath or not os.path.isfile(filepath):
+        return "Borrador no encontrado", 404
+    data = _read_draft(filepath)
+    return _render_draft(data.get("config", {}), data.get("items", []))
+
+
+@bp.route("/scraper/export", methods=["GET"])
+def scraper_export():
+    """
+    Streams a ZIP with the CSV of one or many saved drafts.
+    ?files=<draft.json> (repeatable) selects drafts; ?status=pending|ready|archived
+    exports a whole Kanban column. Drafts are read from disk one at a time.
+    """
+    drafts_dir = current_app.config["DRAFTS_FOLDER"]
+    filenames = [os.path.basename(f) for f in request.args.getlist("files") if f]
+    status = request.args.get("status")
+    if not filenames and status:
+        filenames = [os.path.basename(f) for f in sorted(glob.glob(os.path.join(drafts_dir, "*.json")))]
+    filenames = [f for f in filenames if os.path.exists(os.path.join(drafts_dir, f))]
+    if not filenames:
+        return "Borrador no encontrado", 404
+
+    def drafts():
+        for filename in filenames:
+            try:
+                content = _read_draft(os.path.join(drafts_dir, filename))
+            except (OSError, ValueError):
+                continue
+            if status and content.get("meta", {}).get("status", "pending") != status:
+                continue
+            yield f"{os.path.splitext(filename)[0]}.csv", content.get("config", {}), content.get("items", [])
+
+    name = f"borradores_{status}.zip" if status else "borradores.zip"
+    return _csv_download(iter_drafts_zip(drafts()), name, "application/zip")
 
 
 # ============================================================
 #   SECTION 4: MARKETING TOOLS
 # ============================================================
 
-@app.route("/marketing", methods=["GET"])
+@bp.route("/marketing", methods=["GET"])
 def marketing_index():
     """Renders the sub-menu for Marketing Tools (Tracking and Resizing)."""
     return render_template("marketing_index.html")
 
-@app.route("/marketing/tracking", methods=["POST"])
+def _tracking_form_options(values=None):
+    """
+    Reads the tracking fields shared by the form, bulk and JSON endpoints.
+    values: any dict-like source (defaults to the posted form).
+    """
+    values = request.form if values is None else values
+    channel = values.get("channel")
+    campaign = (values.get("campaign") or "").strip()
+    options = {
+        "source": values.get("source", "APP"),
+        "product": values.get("product", "Entradas"),
+        "social_network": values.get("social_network", "instagram"),
+        "format": values.get("format", "stories"),
+        "date_str": values.get("date_str"),
+    }
+    return channel, campaign, options
+
+
+@bp.route("/marketing/tracking", methods=["POST"])
 def marketing_tracking():
     """Generates tracked URLs for various social and paid channels."""
-    channel = request.form.get("channel")
+    channel, campaign, options = _tracking_form_options()
     urls_raw = request.form.get("urls", "").strip()
-    campaign = request.form.get("campaign", "").strip()
-    source = request.form.get("source", "APP") 
-    product = request.form.get("product", "Entradas") 
-    social_network = request.form.get("social_network", "instagram") 
-    format_type = request.form.get("format", "stories") 
-    date_str = request.form.get("date_str") 
 
     urls = [u.strip() for u in urls_raw.splitlines() if u.strip()]
-    results = []
-
-    for url in urls:
-        final_url = TrackingGenerator.generate_tracking(
-            url, channel, campaign, 
-            source=source, product=product, 
-            social_network=social_network, format=format_type,
-            date_str=date_str
-        )
-        results.append({"original": url, "final": final_url})
+    results = [
+        {"original": url, "final": final_url}
+        for url, final_url in TrackingGenerator.generate_tracking_batch(urls, channel, campaign, **options)
+    ]
     
     return render_template("marketing_result.html", 
                            result_type="Tracking",
                            results=results)
 
-@app.route("/marketing/resize", methods=["POST"])
+
+@bp.route("/marketing/tracking/bulk", methods=["POST"])
+def marketing_tracking_bulk():
+    """
+    Bulk tracking for large URL lists.
+    Reads an uploaded CSV/TXT (one URL per row, or a 'url' column) and streams back a
+    CSV with the original and tracked URLs as it is processed. Throughput is logged
+    as a 'tracking_batch' span.
+    """
+    uploaded_file = request.files.get("urls_file")
+    if not uploaded_file or not uploaded_file.filename:
+        return "No se ha subido ningún fichero de URLs", 400
+
+    channel, campaign, options = _tracking_form_options()
+    # The upload is closed when the request ends, before the response has been streamed
+    rows = csv.reader(io.StringIO(uploaded_file.read().decode("utf-8-sig"), newline=""))
+
+    def generate():
+        with span("tracking_batch") as record:
+            start = time.perf_counter()
+            record["input_size"] = 0
+
+            def tracked():
+                urls = iter_url_column(rows)
+                for pair in TrackingGenerator.generate_tracking_batch(urls, channel, campaign, **options):
+                    record["input_size"] += 1
+                    yield pair
+
+            yield from iter_tracking_csv(tracked())
+            elapsed = time.perf_counter() - start
+            record["urls_per_s"] = round(record["input_size"] / elapsed) if elapsed else None
+
+    filename = f"tracking_{re.sub(r'[^A-Za-z0-9_-]+', '_', campaign) or 'urls'}.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+@bp.route("/marketing/resize", methods=["POST"])
 def marketing_resize():
     """Generates CDN-resized image URLs using Atrápalo's image service."""
     urls_raw = request.form.get("urls", "").strip()
@@ -1164,24 +990,160 @@ def marketing_resize():
                            preview_image=True)
 
 
-@app.route("/uploads/<path:filename>")
+# JSON batch API (marketing tools)
+
+STREAM_CHUNK_CHARS = 64 * 1024
+
+
+def _batch_request():
+    """
+    Reads a batch request for the JSON marketing endpoints.
+    Accepts a JSON object ({"urls": [...], ...options}) or, for very large inputs,
+    an NDJSON body (one URL per line, as a JSON string, a {"url": ...} object or plain
+    text) with the options in the query string, read while the response is streamed.
+    URLs must be strings: a JSON body with any other item is invalid, and NDJSON lines
+    holding another JSON value (null, numbers...) are skipped.
+    Returns (urls iterator, options dict) or None if invalid.
+    """
+    if request.mimetype == "application/x-ndjson":
+        def ndjson_urls():
+            for line in request.stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    item = line.decode("utf-8")
+                if isinstance(item, dict):
+                    item = item.get("url", "")
+                if isinstance(item, str):
+                    yield item.strip()
+        return ndjson_urls(), request.args
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("urls"), list):
+        return None
+    if not all(isinstance(url, str) for url in data["urls"]):
+        return None
+    urls = (url.strip() for url in data["urls"])
+    return urls, {**request.args, **data}
+
+
+def _wants_ndjson(values):
+    """NDJSON output if asked for with 'output': 'ndjson' (body or query) or the Accept header."""
+    if values.get("output") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+
+def _stream_results(pairs, ndjson):
+    """
+    Streams (original, final) pairs as NDJSON lines or as one JSON document
+    {"results": [...], "count": N}, in chunks, without building the response in memory.
+    """
+    def generate():
+        buffer = []
+        size = 0
+        count = 0
+        if not ndjson:
+            buffer.append('{"results": [')
+        for original, final in pairs:
+            item = json.dumps({"original": original, "final": final}, ensure_ascii=False)
+            if ndjson:
+                item += "\n"
+            elif count:
+                item = "," + item
+            buffer.append(item)
+            size += len(item)
+            count += 1
+            if size >= STREAM_CHUNK_CHARS:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        if not ndjson:
+            buffer.append(f'], "count": {count}}}')
+        if buffer:
+            yield "".join(buffer)
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@bp.route("/api/marketing/tracking", methods=["POST"])
+def api_marketing_tracking():
+    """
+    API Endpoint: Tracked URLs for a batch of URLs (same options as the tracking form).
+    Streams {"original", "final"} results as JSON or NDJSON (see _batch_request).
+    """
+    batch = _batch_request()
+    if batch is None:
+        return jsonify({"error": "Se esperaba {\"urls\": [...]} con URLs de texto"}), 400
+    urls, values = batch
+
+    channel, campaign, options = _tracking_form_options(values)
+    pairs = TrackingGenerator.generate_tracking_batch(urls, channel, campaign, **options)
+    return _stream_results(pairs, _wants_ndjson(values))
+
+
+@bp.route("/api/marketing/resize", methods=["POST"])
+def api_marketing_resize():
+    """
+    API Endpoint: CDN-resized image URLs for a batch of URLs ('width', 'quality' options).
+    Streams {"original", "final"} results as JSON or NDJSON (see _batch_request).
+    """
+    batch = _batch_request()
+    if batch is None:
+        return jsonify({"error": "Se esperaba {\"urls\": [...]} con URLs de texto"}), 400
+    urls, values = batch
+
+    width = values.get("width", "")
+    quality = values.get("quality", "75")
+    pairs = ((url, ImageResizer.resize_atrapalo_url(url, width=width, quality=quality)) for url in urls)
+    return _stream_results(pairs, _wants_ndjson(values))
+
+
+def _is_internal_upload(filepath):
+    """True for files of the app state that live inside UPLOAD_FOLDER."""
+    config = current_app.config
+    path = os.path.realpath(filepath)
+    internal_dirs = (get_preview_store().spill_dir, config["HTTP_CACHE_FOLDER"])
+    for folder in internal_dirs:
+        folder = os.path.realpath(folder)
+        if path == folder or path.startswith(folder + os.sep):
+            return True
+    index_file = os.path.realpath(config["DRAFT_INDEX_FILE"])
+    # The index and its temporary files (see draft_index.DraftIndex._save)
+    return path == index_file or path.startswith(index_file + ".")
+
+
+@bp.route("/uploads/<path:filename>")
 def uploaded_files(filename):
-    """Serves files from the uploads directory (e.g., newsletter static previews)."""
-    return send_file(os.path.join(app.config["UPLOAD_FOLDER"], filename))
+    """
+    Serves files from the uploads directory (compressed, with ETag / 304).
+    The app's own state kept there (session previews, compressed variants, URL index)
+    is never served.
+    """
+    filepath = safe_join(current_app.config["UPLOAD_FOLDER"], filename)
+    if filepath is None or _is_internal_upload(filepath):
+        return "Archivo no encontrado", 404
+    return send_cached_file(filepath, current_app.config["HTTP_CACHE_FOLDER"])
 
 import webbrowser
 from threading import Timer
 
-def open_browser():
-    webbrowser.open_new("http://127.0.0.1:5000")
+def open_browser(host="127.0.0.1", port=5000):
+    webbrowser.open_new(f"http://{host}:{port}")
 
 if __name__ == "__main__":
-    # Configuración de modo debug
+    # Servidor de desarrollo (debug + recarga). Para producción: python -m src.server
     debug_mode = True
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    app = create_app()
     
     # Solo abrir navegador si NO es debug (proceso único) 
     # O si es el proceso hijo del reloader (WERKZEUG_RUN_MAIN = true)
     if not debug_mode or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        Timer(1, open_browser).start()
+        Timer(1, open_browser, args=(app.config["HOST"], app.config["PORT"])).start()
         
-    app.run(debug=debug_mode)
\ No newline at end of file
+    app.run(host=app.config["HOST"], port=app.config["PORT"], debug=debug_mode)
\ No newline at end of file
@@ -0,0 +1,207 @@
+import sys
+import os
+import time
+import struct
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.audit import audit_images, check_links, sniff_image, clear_audit_cache, is_public_url
+from src.renderer import apply_utm_tracking
+
+DELAY = 0.2  # simulated CDN latency per request
+
+
+def png(width, height, padding=0):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x02\x00\x00\x00" + b"\x00" * padding
+
+
+def gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00" * 20
+
+
+def jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, height, width) + b"\x03" + b"\x00" * 9
+    return b"\xff\xd8" + app0 + sof + b"\x00" * 100
+
+
+def webp(width, height):
+    bits = (width - 1) | ((height - 1) << 14)
+    return b"RIFF" + struct.pack("<I", 30) + b"WEBPVP8L" + struct.pack("<I", 10) + b"\x2f" + struct.pack("<I", bits) + b"\x00" * 10
+
+
+def avif(width, height):
+    return (struct.pack(">I", 24) + b"ftypavif" + b"\x00" * 12 + b"meta" + b"\x00" * 20
+            + struct.pack(">I", 20) + b"ispe" + b"\x00" * 4 + struct.pack(">II", width, height))
+
+
+IMAGES = {
+    "/card.jpg": jpeg(576, 384),
+    "/header.png": png(1200, 400),
+    "/icon.gif": gif(16, 16),
+    "/photo.webp": webp(800, 600),
+    "/photo.avif": avif(576, 384),
+    "/heavy.png": png(4000, 3000, padding=3 * 1024 * 1024),
+}
+for i in range(20):
+    IMAGES[f"/many/{i}.png"] = png(288 + i, 200)
+
+# Product pages: path -> status (HEAD not allowed on /page/nohead)
+PAGES = {f"/page/{i}": 200 for i in range(60)}
+PAGES.update({"/page/dead": 404, "/page/nohead": 200})
+
+hits = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        hits.append(("HEAD", self.path))
+        time.sleep(DELAY)
+        path = self.path.split("?")[0]
+        if path == "/page/moved":
+            self.send_response(301)
+            self.send_header("Location", "/page/0")
+            self.end_headers()
+        elif path == "/page/nohead":
+            self.send_error(405)
+        elif path in PAGES:
+            self.send_response(PAGES[path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        hits.append(("GET", self.path))
+        time.sleep(DELAY)
+        path = self.path.split("?")[0]
+        if path in PAGES:
+            body = b"<html>ok</html>"
+            self.send_response(PAGES[path])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = IMAGES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(label, condition):
+    print(f"{'✅' if condition else '❌'} {label}")
+
+
+def test_sniffing():
+    print("--- Formatos ---")
+    check("PNG", sniff_image(png(10, 20)) == {"format": "png", "width": 10, "height": 20})
+    check("GIF", sniff_image(gif(16, 16)) == {"format": "gif", "width": 16, "height": 16})
+    check("JPEG", sniff_image(jpeg(576, 384)) == {"format": "jpeg", "width": 576, "height": 384})
+    check("WebP", sniff_image(webp(800, 600)) == {"format": "webp", "width": 800, "height": 600})
+    check("AVIF", sniff_image(avif(576, 384)) == {"format": "avif", "width": 576, "height": 384})
+    check("Desconocido", sniff_image(b"<html>")["format"] is None)
+
+
+def test_audit(base):
+    print("\n--- Auditoría de imágenes ---")
+    paths = ["/card.jpg", "/header.png", "/icon.gif", "/photo.webp", "/photo.avif", "/heavy.png", "/missing.jpg"]
+    paths += [f"/many/{i}.png" for i in range(20)]
+    html = "".join(f'<img src="{base}{p}" style="width:100%">' for p in paths)
+    html += f'<img src="{base}/card.jpg">'  # duplicated image, fetched once
+
+    clear_audit_cache()
+    start = time.perf_counter()
+    report = audit_images(html, budget_bytes=300 * 1024, allow_private=True)
+    elapsed = time.perf_counter() - start
+    print(f"{report['count']} imágenes en {elapsed:.2f} s")
+
+    by_path = {image["url"][len(base):]: image for image in report["images"]}
+    check("URLs deduplicadas", report["count"] == len(paths))
+    check("Concurrente (mucho menos que la suma de latencias)", elapsed < len(paths) * DELAY / 3)
+    check("Dimensiones JPEG", (by_path["/card.jpg"]["width"], by_path["/card.jpg"]["height"]) == (576, 384))
+    check("Peso exacto", by_path["/header.png"]["bytes"] == len(IMAGES["/header.png"]))
+    check("Imagen pesada marcada", report["over_budget"] == [f"{base}/heavy.png"])
+    check("Imagen rota marcada", report["broken"] == [f"{base}/missing.jpg"])
+    check("Total", report["total_bytes"] == sum(len(IMAGES[p]) for p in paths if p in IMAGES))
+
+    before = len(hits)
+    start = time.perf_counter()
+    again = audit_images(html, budget_bytes=300 * 1024, allow_private=True)
+    print(f"Segunda pasada en {time.perf_counter() - start:.2f} s")
+    cached = [image for image in again["images"] if image["cached"]]
+    check("Caché por URL", len(cached) == len(paths) and len(hits) == before)
+
+
+def test_links(base):
+    print("\n--- Comprobación de enlaces ---")
+    cards = "".join(
+        f'<!-- single_card_block --><a href="{base}/page/{i % 60}">Oferta</a>' for i in range(80)
+    )
+    html = (
+        f'<td class="hero"><a href="{base}/page/moved">Header</a></td>'
+        + cards
+        + f'<!-- single_card_block --><a href="{base}/page/dead">Oferta caducada</a>'
+        + "<tr><td></td></tr>" * 15
+        + f'<div class="banner"><a href="{base}/page/nohead">Banner</a></div>'
+        + '<a href="mailto:info@atrapalo.com">Contacto</a><a href="#top">Subir</a>'
+    )
+    html = apply_utm_tracking(html, "Enero Test")
+
+    clear_audit_cache()
+    start = time.perf_counter()
+    report = check_links(html, allow_private=True)
+    elapsed = time.perf_counter() - start
+    print(f"{report['count']} enlaces distintos en {elapsed:.2f} s")
+
+    by_path = {link["url"][len(base):].split("?")[0]: link for link in report["links"]}
+    check("Enlaces deduplicados (sin mailto ni anclas)", report["count"] == 63)
+    check("60 enlaces en segundos", elapsed < 5)
+    check("Redirección seguida", by_path["/page/moved"]["ok"] and by_path["/page/moved"]["final_url"].endswith("/page/0"))
+    check("GET si HEAD no está permitido", by_path["/page/nohead"]["ok"] and by_path["/page/nohead"]["method"] == "GET")
+    broken = report["broken"]
+    check("Enlace roto con su bloque", len(broken) == 1 and broken[0]["status"] == 404 and broken[0]["blocks"] == ["card"])
+    check("Bloques de cabecera y banner", by_path["/page/moved"]["blocks"] == ["hero"] and by_path["/page/nohead"]["blocks"] == ["banner"])
+
+    before = len(hits)
+    again = check_links(html, allow_private=True)
+    check("Caché por URL", all(link["cached"] for link in again["links"]) and len(hits) == before)
+
+
+def test_private_hosts(base):
+    print("\n--- Hosts no públicos ---")
+    check("Loopback, privadas, link-local y otros esquemas rechazados", not any(is_public_url(u) for u in (
+        base, "http://localhost/", "http://10.0.0.5/x.png", "http://192.168.1.1/",
+        "http://169.254.169.254/latest/meta-data/", "http://[::1]/", "file:///etc/passwd", "ftp://1.1.1.1/",
+    )))
+    check("IP pública aceptada", is_public_url("https://1.1.1.1/img.png"))
+
+    clear_audit_cache()
+    before = len(hits)
+    report = audit_images(f'<img src="{base}/card.jpg">')
+    links = check_links(f'<a href="{base}/page/0">Oferta</a>')
+    check("Sin peticiones al servidor local", len(hits) == before)
+    check("Imagen y enlace marcados como rotos", report["broken"] == [f"{base}/card.jpg"] and len(links["broken"]) == 1)
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        test_sniffing()
+        test_audit(base)
+        test_links(base)
+        test_private_hosts(base)
+    finally:
+        server.shutdown()
@@ -5,6 +5,7 @@ import os
 sys.path.append(os.getcwd())
 
 from src.marketing import TrackingGenerator, ImageResizer
+from src.renderer import responsive_image_url
 
 def test_tracking():
     print("--- Testing Tracking ---")
@@ -46,6 +47,23 @@ def test_resizer():
     else:
         print("❌ Resizer FAIL")
 
+    # 2. Responsive width keeps the aspect ratio of a sized image (600x315)
+    card_url = "https://cdn.atrapalo.com/o/event/4803414/1587328.jpg?auto=avif&width=600&quality=75&height=315"
+    responsive = responsive_image_url(card_url, 288)
+    print(f"Responsive: {responsive}")
+    if "width=576" in responsive and "height=302" in responsive:
+        print("✅ Responsive aspect ratio OK")
+    else:
+        print("❌ Responsive aspect ratio FAIL")
+
+    # 3. A height without a width to scale from is dropped
+    responsive = responsive_image_url("https://cdn.atrapalo.com/test.jpg?height=315", 288)
+    print(f"Responsive: {responsive}")
+    if "width=576" in responsive and "height=" not in responsive:
+        print("✅ Responsive height dropped OK")
+    else:
+        print("❌ Responsive height dropped FAIL")
+
 if __name__ == "__main__":
     test_tracking()
     test_resizer()
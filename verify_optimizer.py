@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.optimizer import collapse_whitespace, optimize_email_html
+
+RUN = 200000  # whitespace characters in the long-run checks
+
+
+def check(label, condition):
+    print(f"{'✅' if condition else '❌'} {label}")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def test_collapse():
+    print("--- Espacios ---")
+    check("Espacios junto a bloques", collapse_whitespace("<td> x  </td>\n  <tr>y <br> z</tr>") == "<td>x</td><tr>y<br>z</tr>")
+    check("<pre> intacto", collapse_whitespace("<div> <pre>  a\n  b </pre> </div>") == "<div><pre>  a\n  b </pre></div>")
+    check("Comentarios condicionales conservados", "<!--[if mso]>" in collapse_whitespace("<!--[if mso]><p>x</p><![endif]--> <!-- nota -->"))
+
+
+def test_linear_time():
+    print("\n--- Tiempo lineal ---")
+    cases = {
+        "Espacios entre texto": "<p>a" + " " * RUN + "b</p>",
+        "Espacios antes de un bloque": "<p>a" + " " * RUN + "</p>",
+        "Saltos de línea sin etiquetas": "\n" * RUN + "x",
+    }
+    for label, html in cases.items():
+        _, small = timed(collapse_whitespace, html[:len(html) // 10])
+        result, large = timed(collapse_whitespace, html)
+        print(f"{label}: {RUN // 10} -> {small:.4f}s, {RUN} -> {large:.4f}s")
+        # Quadratic scans took seconds here (100x the time for 10x the input)
+        check(f"{label} en < 0.5 s", large < 0.5 and "  " not in result)
+
+    html, report = optimize_email_html("<table><tr><td>" + " " * RUN + "x</td></tr></table>")
+    check("optimize_email_html con un bloque de espacios", html == "<table><tr><td>x</td></tr></table>" and report["within_budget"])
+
+
+if __name__ == "__main__":
+    test_collapse()
+    test_linear_time()